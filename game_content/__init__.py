@@ -1,6 +1,22 @@
 from .player import Player
 from .bot import BotPlayer
-from .deepq_bot import DeepQBotPlayer
+from .rollout_bot import RolloutBotPlayer
 from .abstract_player import Snake, COLORS
-from .zatacka import Zatacka, Grid
-from .zatacka_playground import ZatackaPlayground
+from .zatacka import Zatacka, Grid, ChunkedGrid
+from .vector_zatacka import VectorZatacka
+from .rooms import RoomManager
+
+# The deep Q bots need mxnet and the playground cv2, which take seconds and
+# hundreds of MB to load : only import them when used, so the game processes
+# of the server start fast
+LAZY = {
+    'DeepQBotPlayer': '.deepq_bot',
+    'ZatackaPlayground': '.zatacka_playground',
+}
+
+
+def __getattr__(name):
+    if name not in LAZY:
+        raise AttributeError('module {} has no attribute {}'.format(__name__, name))
+    import importlib
+    return getattr(importlib.import_module(LAZY[name], __name__), name)
@@ -8,14 +8,16 @@ COLORS = ['#f00', '#0f0', '#00f', '#ff0', '#f0f', '#0ff']
 
 class Snake(object):
 
-    def __init__(self, id, x, y):
+    def __init__(self, id, x, y, direction=None):
         self.id = id
         self.x = x
         self.y = y
         self.speed = 2
         self.turn_speed = 0.05
         self.radius = 2
-        self.direction = random.random() * 2 * math.pi
+        if direction is None:
+            direction = random.random() * 2 * math.pi
+        self.direction = direction
         self.old_x = self.x
         self.old_y = self.y
 
@@ -83,7 +85,7 @@ class AbstractPlayer(object):
     def __init__(self, id):
         raise NotImplementedError
 
-    def spawn(self, x, y):
+    def spawn(self, x, y, direction=None):
         raise NotImplementedError
 
     def process(self, message, game_state):
@@ -98,6 +100,18 @@ class AbstractPlayer(object):
         '''
         raise NotImplementedError
 
+    def steer(self):
+        '''
+        Turn the snake according to the last command, before it moves
+        '''
+        raise NotImplementedError
+
+    def after_update(self, grid):
+        '''
+        Called once the snake has moved and the grid has been stamped
+        '''
+        raise NotImplementedError
+
     def get_snake(self):
         raise NotImplementedError
 
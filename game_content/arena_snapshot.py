@@ -0,0 +1,118 @@
+import numpy
+
+RUN_COLUMNS = 4
+
+
+def encode_runs(block, xs, y0):
+    """
+    Runs of the same non zero owner along y in each row of block
+    block : (rows x cols) cells, row i being the column x = xs[i] of the arena from y0
+    Returns a (runs x 4) array of x, y, length, owner and the block row of each run
+    """
+    occupied = block != 0
+    same_as_previous = numpy.zeros(block.shape, dtype=bool)
+    same_as_previous[:, 1:] = block[:, 1:] == block[:, :-1]
+    same_as_next = numpy.zeros(block.shape, dtype=bool)
+    same_as_next[:, :-1] = same_as_previous[:, 1:]
+
+    start_rows, start_cols = numpy.nonzero(occupied & ~same_as_previous)
+    _, end_cols = numpy.nonzero(occupied & ~same_as_next)
+    return numpy.column_stack([
+        numpy.asarray(xs)[start_rows],
+        y0 + start_cols,
+        end_cols - start_cols + 1,
+        block[start_rows, start_cols],
+    ]).astype(numpy.int64).reshape(-1, RUN_COLUMNS), start_rows
+
+
+class ArenaSnapshot(object):
+    """
+    Run-length encoded copy of the arena, with the owner of each run,
+    sent to the observers that join a game in progress.
+
+    The encoding is kept per block, a column of a Grid or a tile of a
+    ChunkedGrid, and update() only encodes again the blocks that changed
+    since the previous update. A snapshot is then cheap at any tick.
+    """
+
+    def __init__(self):
+        self.grid = None
+        self.blocks = {}
+        self.cells = {}
+        self._runs = None
+
+    def update(self, grid):
+        if grid is not self.grid:
+            self.grid = grid
+            self.blocks = {}
+            self.cells = {}
+            self._runs = None
+
+        if hasattr(grid, 'tiles'):
+            self._update_tiles(grid)
+        else:
+            self._update_columns(grid)
+        return self
+
+    def _update_columns(self, grid):
+        cells = grid.grid
+        previous = self.cells.get(None)
+        if previous is None:
+            previous = self.cells[None] = numpy.zeros_like(cells)
+        changed = numpy.flatnonzero((cells != previous).any(axis=1))
+        if len(changed) == 0:
+            return
+
+        runs, rows = encode_runs(cells[changed], changed, 0)
+        bounds = numpy.searchsorted(rows, numpy.arange(len(changed) + 1))
+        for i, x in enumerate(changed):
+            self.blocks[x] = runs[bounds[i]:bounds[i + 1]]
+        previous[changed] = cells[changed]
+        self._runs = None
+
+    def _update_tiles(self, grid):
+        for key, tile in grid.tiles.items():
+            previous = self.cells.get(key)
+            if previous is not None and numpy.array_equal(previous, tile):
+                continue
+            x0, y0 = grid.tile_origin(key)
+            # Tiles on the border go past the arena, their extra cells stay empty
+            block = tile[:grid.width - x0, :grid.height - y0]
+            self.blocks[key], _ = encode_runs(block, x0 + numpy.arange(block.shape[0]), y0)
+            self.cells[key] = tile.copy()
+            self._runs = None
+
+    def runs(self):
+        """
+        (runs x 4) array of x, y, length, owner covering every occupied cell
+        """
+        if self._runs is None:
+            blocks = [runs for runs in self.blocks.values() if len(runs)]
+            self._runs = numpy.concatenate(blocks) if blocks else \
+                numpy.zeros((0, RUN_COLUMNS), dtype=numpy.int64)
+        return self._runs
+
+    def message(self, frame):
+        return {'type': 'arena', 'frame': frame, 'runs': self.runs().ravel().tolist()}
+
+
+def run_cells(runs):
+    """
+    Coordinates and owner of every cell covered by the runs of a snapshot
+    """
+    runs = numpy.asarray(runs, dtype=numpy.int64).reshape(-1, RUN_COLUMNS)
+    lengths = runs[:, 2]
+    # Offset of each cell in its run
+    offsets = numpy.arange(lengths.sum()) - numpy.repeat(numpy.cumsum(lengths) - lengths, lengths)
+    return (numpy.repeat(runs[:, 0], lengths), numpy.repeat(runs[:, 1], lengths) + offsets,
+            numpy.repeat(runs[:, 3], lengths))
+
+
+def paint_runs(runs, width, height):
+    """
+    Dense (width x height) arena from the runs of a snapshot
+    """
+    cells = numpy.zeros((width, height), dtype=numpy.uint8)
+    xs, ys, owners = run_cells(runs)
+    cells[xs, ys] = owners
+    return cells
@@ -18,14 +18,8 @@ class BotPlayer(Player):
 
         raise NotImplemented
 
-    def update(self, grid):
-        if not self.alive:
-            return
+    def steer(self):
         if self.command == 'left':
             self.snake.turn_left()
         if self.command == 'right':
             self.snake.turn_right()
-        self.snake.move(grid.width, grid.height)
-        if self.snake.collision(grid):
-            self.alive = False
-        self.snake.update_grid(grid)
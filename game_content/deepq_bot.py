@@ -8,9 +8,9 @@ from .double_q_network import GridReplayAdapter, DoubleQNetwork
 
 class AbstractDeepQGameAdapter(object, metaclass=ABCMeta):
 
-    def __init__(self, buffer_size=10, time_frame_size=10,
+    def __init__(self, buffer_size=None, time_frame_size=10,
                  game_size=(80, 80), action_size=4, batch_size=10,
-                 gamma=0.9, ctx=mx.cpu(), num_layers=2):
+                 gamma=0.9, ctx=mx.cpu(), num_layers=2, buffer_bytes=None):
         """
         The double Q has this order for its steps
         1 : current state of the game
@@ -28,9 +28,10 @@ class AbstractDeepQGameAdapter(object, metaclass=ABCMeta):
         Thus it will be done in the update step
         """
         self.replay_adapter = GridReplayAdapter(buffer_size, time_frame_size,
-                                                game_size, action_size)
+                                                game_size, action_size, buffer_bytes=buffer_bytes)
         self.commands = range(action_size)
-        self.buffer_size = buffer_size
+        # Transitions held, the default size fits GridReplayAdapter.default_buffer_bytes
+        self.buffer_size = self.replay_adapter.buffer_size
         self.time_frame_size = time_frame_size
         self.game_size = game_size
         self.network = DoubleQNetwork(batch_size, time_frame_size, game_size, action_size,
@@ -41,6 +42,8 @@ class AbstractDeepQGameAdapter(object, metaclass=ABCMeta):
         # Update and freeze parameter for the parameter changes
         self.update_time = 1000
         self.freeze_time = 1000
+        # Steps stored before the first training, the buffer may hold much more
+        self.learning_start = min(self.buffer_size, 1000)
 
     def process_game_state(self, game_state, time_step, score, alive):
         """
@@ -118,7 +121,7 @@ class DeepQBotPlayer(AbstractDeepQGameAdapter, BotPlayer):
     Thus it will be done in the update step
     """
 
-    def __init__(self, id_, buffer_size=10, time_frame_size=10,
+    def __init__(self, id_, buffer_size=None, time_frame_size=10,
                  game_size=(80, 80), action_size=4, num_layers=2):
         BotPlayer.__init__(self, id_)
         AbstractDeepQGameAdapter.__init__(self, buffer_size, time_frame_size,
@@ -136,17 +139,24 @@ class DeepQBotPlayer(AbstractDeepQGameAdapter, BotPlayer):
 
         # The time and score are assigned from the game through the Player interface
         self.process_game_state(game_state, self.time_step, self.reward, int(self.alive))
+        self.time_step += 1
 
-    def update(self, grid):
-        # Do the drawing etc
-        BotPlayer.update(self, grid)
+    def spawn(self, x, y, direction=None):
+        BotPlayer.spawn(self, x, y, direction)
+        # A new game, even when the bot survived the last one
+        self.replay_adapter.start_episode_in_history()
 
+    def after_update(self, grid):
+        # The engine already moved the snake and drew its trail
         # Here we have all the data for transition at t-1
         # (because we stored the reward from step t-1 on step t)
 
+        # The engine already set alive, a dead bot is not processed again to store it
+        self.replay_adapter.store_death_in_history(int(self.alive), self.time_step - 1)
+
         if self.time_step % self.update_time == 0 and\
-           self.time_step > self.buffer_size + self.time_frame_size:
-            self.network_train()
+           self.time_step > self.learning_start + self.time_frame_size:
+            self.network_backward(self.time_step)
 
         if self.time_step % self.freeze_time == 0:
             # Freeze the parameters learnt and change the forward network
@@ -1,8 +1,88 @@
 from abc import abstractmethod, ABCMeta
+import warnings
 import mxnet as mx
 import mxnet.ndarray as nd
 import numpy
-import random
+from .replay_buffer import ReplayBuffer
+from .prefetch import BatchPrefetcher
+
+# Lookup tables of the self centered view, by player id and dtype or packed format
+_VIEW_TABLES = {}
+
+
+def self_centered_table(player_id, dtype=numpy.float32):
+    """
+    Value of each possible cell in the view of player_id :
+    1 on its own trail, -1 on the trails of the others, 0 on the empty cells
+    """
+    key = (player_id, numpy.dtype(dtype))
+    if key not in _VIEW_TABLES:
+        table = numpy.full(256, -1, dtype=dtype)
+        table[0] = 0
+        table[player_id] = 1
+        _VIEW_TABLES[key] = table
+    return _VIEW_TABLES[key]
+
+
+def encode_observation(cells, player_id, out=None):
+    """
+    Self centered view of the arena, in one vectorized lookup
+    cells : the cell values, a uint8 array is used without copy
+    out : preallocated array of the shape of cells the view is written to,
+          a new float32 array is returned without it
+    """
+    cells = numpy.asarray(cells, dtype=numpy.uint8)
+    table = self_centered_table(player_id, numpy.float32 if out is None else out.dtype)
+    # Ids fit a byte so the indices never need a bound check
+    return numpy.take(table, cells, out=out, mode='clip')
+
+
+# Packed observations hold 4 cells per byte, 2 bits each, the first cell in the low bits :
+# 0 for an empty cell, 1 for the own trail, 2 for the trail of another player
+CELLS_PER_BYTE = 4
+# Values of the 4 cells of each byte
+UNPACK_TABLE = numpy.array([[[0., 1., -1., 0.][(byte >> (2 * k)) & 3] for k in range(CELLS_PER_BYTE)]
+                            for byte in range(256)], dtype=numpy.float32)
+
+
+def packed_size(game_size):
+    """
+    Bytes of a packed observation of the arena
+    """
+    return -(-int(numpy.prod(game_size)) // CELLS_PER_BYTE)
+
+
+def pack_observation(cells, player_id, out, codes=None):
+    """
+    Self centered view of the arena, packed in 2 bits per cell into out
+    codes : scratch array of len(out) * CELLS_PER_BYTE uint8, allocated when None
+    """
+    cells = numpy.asarray(cells, dtype=numpy.uint8).reshape(-1)
+    if codes is None:
+        codes = numpy.zeros(len(out) * CELLS_PER_BYTE, dtype=numpy.uint8)
+    key = (player_id, 'packed')
+    if key not in _VIEW_TABLES:
+        table = numpy.full(256, 2, dtype=numpy.uint8)
+        table[0] = 0
+        table[player_id] = 1
+        _VIEW_TABLES[key] = table
+    numpy.take(_VIEW_TABLES[key], cells, out=codes[:len(cells)], mode='clip')
+    codes = codes.reshape(-1, CELLS_PER_BYTE)
+    out[:] = codes[:, 0] | (codes[:, 1] << 2) | (codes[:, 2] << 4) | (codes[:, 3] << 6)
+    return out
+
+
+def unpack_observations(packed, out):
+    """
+    Expand packed observations (..., packed_size) to their float view out (..., width, height)
+    """
+    cells = out[(0,) * (packed.ndim - 1)].size
+    expanded = packed.shape + (CELLS_PER_BYTE,)
+    if cells == packed.shape[-1] * CELLS_PER_BYTE and out.flags.c_contiguous:
+        numpy.take(UNPACK_TABLE, packed, axis=0, out=out.reshape(expanded), mode='clip')
+    else:
+        out[...] = UNPACK_TABLE[packed].reshape(packed.shape[:-1] + (-1,))[..., :cells].reshape(out.shape)
+    return out
 
 
 class AbstractReplayAdapter(object, metaclass=ABCMeta):
@@ -20,20 +100,47 @@ class AbstractReplayAdapter(object, metaclass=ABCMeta):
 
 class GridReplayAdapter(AbstractReplayAdapter):
 
-    def __init__(self, buffer_size, time_frame_size, game_size, action_size):
+    # Assemble the next minibatch in a background thread during the training
+    prefetch = True
+    # Memory of the replays when neither their size nor their memory is given
+    default_buffer_bytes = 64 * 2 ** 20
+
+    def __init__(self, buffer_size, time_frame_size, game_size, action_size, buffer_bytes=None):
+        """
+        buffer_size : number of transitions kept for the replays, None for default_buffer_bytes
+        buffer_bytes : memory of the replays, overrides buffer_size when given
+        """
         # Vars used on the NN side to store data as mx.nd
         self.memory = []
-        self.buffer_size = buffer_size
         self.time_frame_size = time_frame_size
         self.game_size = game_size
         self.action_size = action_size
+        # The observation of the current step is encoded there
+        self.observation = numpy.zeros(game_size, dtype=numpy.float32)
+
+        # The replays keep the observations packed, they are only expanded to build the network inputs
+        packed_shape = (packed_size(game_size),)
+        if buffer_bytes is None and buffer_size is None:
+            buffer_bytes = self.default_buffer_bytes
+        if buffer_bytes is not None:
+            buffer_size = buffer_bytes // ReplayBuffer.transition_bytes(packed_shape, numpy.uint8)
+        # A replay needs a full phi_t and the step after it
+        if buffer_size < time_frame_size + 1:
+            warnings.warn('A replay buffer of {} transitions is too small for stacks of {} frames, '
+                          'it holds {}'.format(buffer_size, time_frame_size, time_frame_size + 1))
+        self.buffer_size = max(buffer_size, time_frame_size + 1)
 
-        # Game status object storage
-        self.grid_history = {}
-        self.action_history = {}
-        self.reward_history = {}
-        self.termination_history = {}
-        self.phi_history = {}
+        # Game status object storage, the oldest steps are evicted
+        self.replay = ReplayBuffer(self.buffer_size, packed_shape, numpy.uint8)
+        self.codes = numpy.zeros(packed_shape[0] * CELLS_PER_BYTE, dtype=numpy.uint8)
+        # phi_t is assembled there for the inference
+        self.packed_phi = numpy.zeros((time_frame_size,) + packed_shape, dtype=numpy.uint8)
+        self.phi = numpy.zeros((time_frame_size,) + tuple(game_size), dtype=numpy.float32)
+        self.nd_phi = nd.zeros(self.phi.shape)
+        # Network inputs of the replays, filled from the staging arrays
+        self.replay_inputs = None
+        self.packed_stacks = None
+        self.prefetcher = None
 
         # Performance logging
         # TODO : not used yet
@@ -44,21 +151,68 @@ class GridReplayAdapter(AbstractReplayAdapter):
         This function creates a random minibatch from the play history
         We chose a set of random t from the reward history
         from it we retrieve the corresponding phi_t,phi_t+1 and a_t
+
+        With prefetch on, the batch returned was drawn in the background
+        during the previous call, from the steps held at that time.
+        The returned arrays are reused by the next call.
+        """
+        if self.replay_inputs is None or self.replay_inputs["at"].shape[0] != batch_size:
+            self.close_prefetch()
+            shape = (batch_size, self.time_frame_size) + tuple(self.game_size)
+            self.replay_inputs = {"st": nd.zeros(shape), "stpo": nd.zeros(shape),
+                                  "at": nd.zeros((batch_size,)), "rt": nd.zeros((batch_size,)),
+                                  "tt": nd.ones((batch_size,))}
+
+        if not self.prefetch:
+            staging = self.make_staging(batch_size)
+            self.assemble_replay(staging, batch_size, time_step)
+        else:
+            if self.prefetcher is None:
+                self.prefetcher = BatchPrefetcher(self.assemble_replay,
+                                                  lambda: self.make_staging(batch_size))
+            staging = self.prefetcher.next(batch_size, time_step)
+
+        for key, value in staging.items():
+            self.replay_inputs[key][:] = value
+        return self.replay_inputs
+
+    def make_staging(self, batch_size):
+        shape = (batch_size, self.time_frame_size) + tuple(self.game_size)
+        return {"st": numpy.zeros(shape, dtype=numpy.float32), "stpo": numpy.zeros(shape, dtype=numpy.float32),
+                "at": numpy.zeros(batch_size, dtype=numpy.float32),
+                "rt": numpy.zeros(batch_size, dtype=numpy.float32),
+                "tt": numpy.ones(batch_size, dtype=numpy.float32)}
+
+    def assemble_replay(self, staging, batch_size, time_step):
+        """
+        Draw batch_size steps before time_step and gather their transitions into the staging arrays
         """
-        replay_dict = {"st": nd.zeros((batch_size, self.time_frame_size,
-                                          self.game_size[0], self.game_size[1])),
-                       "stpo": nd.zeros((batch_size, self.time_frame_size,
-                                                   self.game_size[0], self.game_size[1])),
-                       "at": nd.zeros((batch_size,)),
-                       "rt": nd.zeros((batch_size,)),
-                       "tt": nd.ones((batch_size,))}
-        for i, t in zip(range(batch_size), random.sample(list(range(self.time_frame_size + 1, time_step)), batch_size)):
-            replay_dict["st"][i, :, :, :] = self.phi_history[t]
-            replay_dict["stpo"][i, :, :, :] = self.phi_history[t + 1]
-            replay_dict["at"][i] = self.action_history[t]
-            replay_dict["rt"][i] = self.reward_history[t]
-
-        return replay_dict
+        replay = self.replay
+        # The lock is only held to copy out the packed stacks, they are expanded after it
+        with replay.lock:
+            candidates = replay.replayable(self.time_frame_size + 1, time_step)
+            # Less replays than asked right after a restart, some are drawn twice
+            sample = numpy.random.choice(candidates, batch_size, replace=len(candidates) < batch_size)
+            slots = sample % replay.capacity
+            episodes = replay.episodes[slots]
+            # The stacks of st and stpo
+            shape = (2, batch_size, self.time_frame_size) + replay.observations.shape[1:]
+            if self.packed_stacks is None or self.packed_stacks.shape != shape:
+                self.packed_stacks = numpy.zeros(shape, dtype=numpy.uint8)
+            replay.frame_stacks(sample, self.time_frame_size, self.packed_stacks[0], episodes)
+            # The stack after the last step of an episode is discounted away, it stays in the episode
+            replay.frame_stacks(sample + 1, self.time_frame_size, self.packed_stacks[1], episodes)
+            staging["at"][:] = replay.actions[slots]
+            staging["rt"][:] = replay.rewards[slots]
+            staging["tt"][:] = replay.alive[slots]
+        unpack_observations(self.packed_stacks[0], staging["st"])
+        unpack_observations(self.packed_stacks[1], staging["stpo"])
+        return staging
+
+    def close_prefetch(self):
+        if self.prefetcher is not None:
+            self.prefetcher.close()
+            self.prefetcher = None
 
     #####################
     #  History storage  #
@@ -66,66 +220,54 @@ class GridReplayAdapter(AbstractReplayAdapter):
 
     def store_grid_in_history(self, grid, t, player):
         """
-        The grid type is a list of list
-        It must be transformed to a player invariant view and a mxnet array to be used later
+        The grid is transformed to a player invariant view, packed straight in the replay buffer
         """
-        print("Storing grid with timestep t {}".format(t))
-        nd_grid = self._transform_grid_to_nd_mat(grid, player)
-        self.grid_history[t] = nd_grid
+        with self.replay.lock:
+            pack_observation(grid, player.id, self.replay.store_observation(t), codes=self.codes)
 
     def store_action_in_history(self, action, t):
         """
         Store each action after each time stamp
         """
-        #print("Storing action {} with timestep t {}".format(action, t))
-        self.action_history[t] = action
+        self.replay.store_action(t, action)
 
     def store_reward_in_history(self, reward, t):
         """
         Store the reward given by the game
         """
-        #print("Storing reward {} with timestep t {}".format(reward, t))
-        self.reward_history[t] = reward
+        self.replay.store_reward(t, reward)
 
     def store_death_in_history(self, alive, t):
-        self.termination_history[t] = alive
+        self.replay.store_alive(t, alive)
+
+    def start_episode_in_history(self):
+        """
+        The next grid stored starts a new game, its frames are not stacked with the previous ones
+        """
+        self.replay.new_episode()
 
     def build_phi_t(self, t):
         """
         Phi_t correspond to the last n sample from the game state
         n is in fact the time_frame_size parameters on the init
+        The frames before the start of the episode are empty.
 
         We cant produce phi_t if there is less than n time stamps
+        The returned array is reused by the next call.
         """
-        if t > self.time_frame_size:
-            self.phi_history[t] = nd.zeros((self.time_frame_size, self.game_size[0], self.game_size[1]))
-            for i in range(self.time_frame_size):
-                self.phi_history[t][i, :, :] = self.grid_history[len(self.grid_history) - (i + 1)]
-
-        if t > self.time_frame_size:
-            return self.phi_history[t]
-        else:
+        if t <= self.time_frame_size:
             return None
 
+        self.replay.frame_stack(t, self.time_frame_size, self.packed_phi)
+        unpack_observations(self.packed_phi, self.phi)
+        self.nd_phi[:] = self.phi
+        return self.nd_phi
+
     def _transform_grid_to_nd_mat(self, grid, player, debug=False):
         """
-        transform a grid (list of list) to nd_array with self centered view
+        transform a grid (numpy array or list of list) to nd_array with self centered view
         """
-
-        # First adapt the grid format to reach an image like representation
-        self_view_grid = [[0] * len(vec) for vec in grid]
-
-        # Transform the map to be self centered
-        for i, vec in enumerate(grid):
-            for j, val in enumerate(vec):
-                if val == 0:
-                    continue
-                elif val == player.id:
-                    self_view_grid[i][j] = 1
-                else:
-                    self_view_grid[i][j] = -1
-
-        return nd.array(numpy.array(self_view_grid))
-
-
-
+        if self.observation.shape != numpy.shape(grid):
+            self.observation = numpy.zeros(numpy.shape(grid), dtype=numpy.float32)
+        encode_observation(grid, player.id, out=self.observation)
+        return nd.array(self.observation, dtype=self.observation.dtype)
@@ -0,0 +1,61 @@
+import queue
+import threading
+
+
+class BatchPrefetcher(object):
+    """
+    Assembles the next minibatch in a background thread while the network
+    trains on the current one.
+    Two staging buffers take turns : the thread fills one of them while the
+    other one is handed out, so a batch is never overwritten before it is used.
+    """
+
+    def __init__(self, assemble, make_staging):
+        """
+        assemble : assemble(staging, *args) fills the staging buffers with a batch
+        make_staging : returns a new set of staging buffers
+        """
+        self.assemble = assemble
+        self.staging = [make_staging(), make_staging()]
+        self.requests = queue.Queue()
+        self.ready = queue.Queue()
+        self.pending = False
+        self.thread = threading.Thread(target=self.work, name='batch-prefetch')
+        self.thread.daemon = True
+        self.thread.start()
+
+    def work(self):
+        while True:
+            request = self.requests.get()
+            if request is None:
+                return
+            staging, args = request
+            try:
+                self.assemble(staging, *args)
+                self.ready.put((staging, None))
+            except Exception as error:
+                self.ready.put((staging, error))
+
+    def next(self, *args):
+        """
+        Returns the staging buffers of a batch, the one prepared after the last
+        call if there is one, then starts preparing the next batch with args.
+        The buffers returned are valid until the following call.
+        """
+        if self.pending:
+            self.pending = False
+            staging, error = self.ready.get()
+            if error is not None:
+                raise error
+        else:
+            staging = self.staging[0]
+            self.assemble(staging, *args)
+
+        other = self.staging[1] if staging is self.staging[0] else self.staging[0]
+        self.requests.put((other, args))
+        self.pending = True
+        return staging
+
+    def close(self):
+        self.requests.put(None)
+        self.thread.join()
@@ -0,0 +1,125 @@
+import threading
+import numpy
+
+
+class ReplayBuffer(object):
+    """
+    Transitions of one player in a fixed capacity ring of preallocated arrays.
+    The time step t lives in the slot t % capacity, so storing a step evicts
+    the oldest one in O(1) and the memory stays flat for the whole training.
+
+    Each observation is stored once, the stacks of the last frames fed to
+    the network are index ranges into the ring that are only copied out
+    when an input is assembled.
+    """
+
+    def __init__(self, capacity, observation_shape, observation_dtype=numpy.float32):
+        self.capacity = capacity
+        self.observations = numpy.zeros((capacity,) + tuple(observation_shape), dtype=observation_dtype)
+        self.actions = numpy.zeros(capacity, dtype=numpy.int32)
+        self.rewards = numpy.zeros(capacity, dtype=numpy.float32)
+        # 1 while the player is alive after the step, the network discounts with it
+        self.alive = numpy.ones(capacity, dtype=numpy.float32)
+        # Time step held by each slot, -1 for the empty slots
+        self.steps = numpy.full(capacity, -1, dtype=numpy.int64)
+        # Episode of each slot, a stack never mixes the frames of two episodes
+        self.episodes = numpy.full(capacity, -1, dtype=numpy.int64)
+        self.episode = -1
+        self.last_step = None
+        # Held to evict a step while a minibatch may be gathered by another thread
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def transition_bytes(observation_shape, observation_dtype=numpy.float32):
+        """
+        Memory used by one transition, to size a buffer in bytes
+        """
+        observation = int(numpy.prod(observation_shape)) * numpy.dtype(observation_dtype).itemsize
+        # action, reward, alive, step and episode
+        return observation + 4 + 4 + 4 + 8 + 8
+
+    def __len__(self):
+        return int(numpy.count_nonzero(self.steps >= 0))
+
+    def holds(self, t):
+        return t >= 0 and self.steps[t % self.capacity] == t
+
+    def store_observation(self, t, observation=None):
+        """
+        Start the transition of time step t, evicting the one in its slot
+        A new episode starts when t does not follow the last step or the player died on it
+        Returns the observation slot, to encode the observation straight into it
+        """
+        if self.last_step is None or t != self.last_step + 1 or \
+                (self.holds(self.last_step) and not self.alive[self.last_step % self.capacity]):
+            self.episode += 1
+        self.last_step = t
+        slot = t % self.capacity
+        self.steps[slot] = t
+        self.episodes[slot] = self.episode
+        self.actions[slot] = 0
+        self.rewards[slot] = 0
+        self.alive[slot] = 1
+        if observation is not None:
+            self.observations[slot] = observation
+        return self.observations[slot]
+
+    def new_episode(self):
+        """
+        The next stored step starts an episode, even if it follows the last one
+        """
+        self.last_step = None
+
+    def store_action(self, t, action):
+        if self.holds(t):
+            self.actions[t % self.capacity] = action
+
+    def store_reward(self, t, reward):
+        if self.holds(t):
+            self.rewards[t % self.capacity] = reward
+
+    def store_alive(self, t, alive):
+        if self.holds(t):
+            self.alive[t % self.capacity] = alive
+
+    def observation(self, t):
+        return self.observations[t % self.capacity]
+
+    def episode_of(self, t):
+        return self.episodes[t % self.capacity] if self.holds(t) else -1
+
+    def frame_stack(self, t, length, out, episode=None):
+        """
+        Copy the observations of t, t - 1, ..., t - length + 1 to out, the newest first
+        The frames missing or from another episode than `episode` (the one of t
+        by default) are left empty.
+        """
+        if episode is None:
+            episode = self.episode_of(t)
+        return self.frame_stacks(numpy.array([t]), length, out[None], numpy.array([episode]))[0]
+
+    def frame_stacks(self, ts, length, out, episodes):
+        """
+        frame_stack of every step of ts at once, out has the shape (len(ts), length) + observation
+        """
+        steps = ts[:, None] - numpy.arange(length)
+        slots = steps % self.capacity
+        numpy.take(self.observations, slots, axis=0, out=out, mode='clip')
+        out[(self.steps[slots] != steps) | (self.episodes[slots] != episodes[:, None])] = 0
+        return out
+
+    def replayable(self, first, last):
+        """
+        Steps of [first, last) held with the step after them, or that ended their episode
+        """
+        ts = numpy.arange(max(first, last - self.capacity), last)
+        slots = ts % self.capacity
+        next_slots = (ts + 1) % self.capacity
+        held = self.steps[slots] == ts
+        followed = (self.steps[next_slots] == ts + 1) & (self.episodes[next_slots] == self.episodes[slots])
+        return ts[held & (followed | (self.alive[slots] == 0))]
+
+    def clear(self):
+        self.steps[:] = -1
+        self.episodes[:] = -1
+        self.last_step = None
@@ -0,0 +1,105 @@
+"""
+Vectorized snake kinematics
+
+These helpers reproduce Snake.move, Snake.collision and Snake.update_grid
+on arrays of snakes so a whole tick can be processed in a few numpy calls.
+Every helper accepts arrays with any leading shape (players, or games x players).
+"""
+import numpy
+
+# The five sensors sit on the front half circle of the snake, every 30 degrees
+SENSOR_ANGLES = numpy.pi * numpy.arange(-2, 3) / 6
+
+
+def move(x, y, direction, speed, width, height):
+    """
+    Same as Snake.move, returns the new positions
+    """
+    new_x = x + speed * numpy.cos(direction)
+    new_y = y - speed * numpy.sin(direction)
+
+    new_x = numpy.where(new_x > width, 0., new_x)
+    new_y = numpy.where(new_y > height, 0., new_y)
+    new_x = numpy.where(new_x < 0, float(width), new_x)
+    new_y = numpy.where(new_y < 0, float(height), new_y)
+    return new_x, new_y
+
+
+def sensor_cells(x, y, direction, radius):
+    """
+    Cells checked by Snake.collision, shape (..., 5)
+    """
+    radius = numpy.asarray(radius, dtype=float)[..., None]
+    angles = numpy.asarray(direction)[..., None] + SENSOR_ANGLES
+    xs = numpy.rint(numpy.asarray(x)[..., None] + radius * numpy.cos(angles))
+    ys = numpy.rint(numpy.asarray(y)[..., None] - radius * numpy.sin(angles))
+    return xs.astype(numpy.intp), ys.astype(numpy.intp)
+
+
+def trail_cells(x, y, radius, max_radius):
+    """
+    Rows and columns of the square stamped by Snake.update_grid, shape (..., 2 * max_radius)
+    Snakes with a smaller radius than max_radius get a validity mask on the extra offsets.
+    """
+    offsets = numpy.arange(2 * max_radius)
+    radius = numpy.asarray(radius)[..., None]
+    xs = numpy.rint((numpy.asarray(x)[..., None] - radius) + offsets)
+    ys = numpy.rint((numpy.asarray(y)[..., None] - radius) + offsets)
+    valid = offsets < 2 * radius
+    return xs.astype(numpy.intp), ys.astype(numpy.intp), valid
+
+
+def earlier_stamp_hits(sensor_xs, sensor_ys, trail_xs, trail_ys, trail_valid):
+    """
+    The players are updated one after the other, so a sensor also sees the
+    squares stamped earlier in the same tick by the players before it.
+    All coordinates must already be wrapped.
+
+    sensor_xs, sensor_ys : (..., players, 5)
+    trail_xs, trail_ys, trail_valid : (..., players, 2 * max_radius)
+    Returns a (..., players) mask
+    """
+    in_x = ((sensor_xs[..., :, :, None, None] == trail_xs[..., None, None, :, :])
+            & trail_valid[..., None, None, :, :]).any(axis=-1)
+    in_y = ((sensor_ys[..., :, :, None, None] == trail_ys[..., None, None, :, :])
+            & trail_valid[..., None, None, :, :]).any(axis=-1)
+    nb_players = sensor_xs.shape[-2]
+    earlier = numpy.tri(nb_players, k=-1, dtype=bool)
+    return (in_x & in_y & earlier[:, None, :]).any(axis=(-1, -2))
+
+
+def advance_snakes(grid, ids, x, y, direction, speed, radius):
+    """
+    Move every snake one tick, check its sensors then stamp the square it left,
+    with the same result as calling Player.update on each snake in order.
+
+    grid : a Grid, modified in place
+    ids, x, y, direction, speed, radius : arrays with one entry per snake
+    Returns the new x, y and the collision mask
+    """
+    new_x, new_y = move(x, y, direction, speed, grid.width, grid.height)
+
+    sensor_xs, sensor_ys = sensor_cells(new_x, new_y, direction, radius)
+    sensor_xs, sensor_ys = grid.wrap_coordinates(sensor_xs, sensor_ys)
+    collided = grid.get_many(sensor_xs, sensor_ys).any(axis=-1)
+
+    max_radius = int(numpy.max(radius))
+    trail_xs, trail_ys, valid = trail_cells(x, y, radius, max_radius)
+    trail_xs, trail_ys = grid.wrap_coordinates(trail_xs, trail_ys)
+    collided |= earlier_stamp_hits(sensor_xs, sensor_ys, trail_xs, trail_ys, valid)
+    stamp_trails(grid, ids, trail_xs, trail_ys, valid)
+
+    return new_x, new_y, collided
+
+
+def stamp_trails(grid, ids, trail_xs, trail_ys, valid):
+    """
+    Write the squares of trail_cells (already wrapped) on the grid
+    """
+    # Outer product of the rows and columns, flattened in player order so
+    # later players overwrite earlier ones like the sequential update does
+    mask = valid[:, :, None] & valid[:, None, :]
+    cell_xs = numpy.broadcast_to(trail_xs[:, :, None], mask.shape)[mask]
+    cell_ys = numpy.broadcast_to(trail_ys[:, None, :], mask.shape)[mask]
+    values = numpy.broadcast_to(numpy.asarray(ids)[:, None, None], mask.shape)[mask]
+    grid.set_many(cell_xs, cell_ys, values)
@@ -0,0 +1,118 @@
+import os
+import struct
+import tempfile
+import collections
+from .abstract_player import COLORS
+
+# frame number, number of snakes
+STEP_HEADER = struct.Struct('<IB')
+# id, died, x, y
+SNAKE_RECORD = struct.Struct('<BBff')
+
+
+def pack_step(step):
+    died = step.get('died', ())
+    chunks = [STEP_HEADER.pack(step['frame'], len(step['content']))]
+    for snake in step['content']:
+        chunks.append(SNAKE_RECORD.pack(snake['id'], snake['id'] in died, snake['x'], snake['y']))
+    return b''.join(chunks)
+
+
+def read_steps(log):
+    """
+    Step messages of a spilled log, from its current position
+    Positions come back as float32
+    """
+    while True:
+        header = log.read(STEP_HEADER.size)
+        if len(header) < STEP_HEADER.size:
+            return
+        frame, count = STEP_HEADER.unpack(header)
+        records = log.read(count * SNAKE_RECORD.size)
+        snakes, died = [], []
+        for i in range(count):
+            id_, dead, x, y = SNAKE_RECORD.unpack_from(records, i * SNAKE_RECORD.size)
+            snakes.append({'id': id_, 'x': x, 'y': y, 'color': COLORS[id_ - 1]})
+            if dead:
+                died.append(id_)
+        yield {'type': 'step', 'frame': frame, 'content': snakes, 'died': died}
+
+
+class LogReader(object):
+    """
+    Reads a file from the start without moving its offset, so it can still be appended to
+    flush : called before each read, to reach what was appended through a write buffer
+    """
+
+    def __init__(self, fileno, flush=None):
+        self.fileno = fileno
+        self.flush = flush
+        self.position = 0
+
+    def read(self, size):
+        if self.flush is not None:
+            self.flush()
+        data = os.pread(self.fileno, size, self.position)
+        self.position += len(data)
+        return data
+
+
+class FrameHistory(object):
+    """
+    Step messages of the current game.
+    The last `capacity` steps stay in memory, the older ones are appended
+    to a log on disk, so the memory used does not grow with the game.
+    Iterating goes through the log first, then through the memory.
+    """
+
+    def __init__(self, capacity=1024, spill_path=None):
+        """
+        spill_path : file of the log, a temporary file when None
+        """
+        self.capacity = capacity
+        self.spill_path = spill_path
+        self.recent = collections.deque()
+        self.log = None
+        self.spilled = 0
+
+    def append(self, step):
+        if len(self.recent) >= self.capacity:
+            self.spill(self.recent.popleft())
+        self.recent.append(step)
+
+    def spill(self, step):
+        if self.log is None:
+            if self.spill_path is None:
+                self.log = tempfile.TemporaryFile()
+            else:
+                self.log = open(self.spill_path, 'w+b')
+        self.log.write(pack_step(step))
+        self.spilled += 1
+
+    def __len__(self):
+        return self.spilled + len(self.recent)
+
+    def __getitem__(self, index):
+        """
+        Only the steps still in memory can be indexed, iterate to read the older ones
+        """
+        if index < 0:
+            index += len(self)
+        if not self.spilled <= index < len(self):
+            raise IndexError('Step {} is not in memory'.format(index))
+        return self.recent[index - self.spilled]
+
+    def __iter__(self):
+        if self.log is not None:
+            # The steps spilled while iterating are still read, they go through the write buffer
+            for step in read_steps(LogReader(self.log.fileno(), self.log.flush)):
+                yield step
+        for step in list(self.recent):
+            yield step
+
+    def clear(self):
+        self.recent.clear()
+        self.spilled = 0
+        if self.log is not None:
+            self.log.close()
+            self.log = None
@@ -0,0 +1,76 @@
+import collections
+from .scheduler import Histogram
+
+
+class LatencyTracer(object):
+    """
+    Timestamps of the commands of a player along their way through the server :
+    received on /submit, applied by a tick, broadcast in a frame, then
+    acknowledged by the client once it got the echo of the frame.
+
+    The client numbers its commands with a 'seq' field, and sends back
+    {'ack': seq} when the echo of that command reaches it.
+    """
+
+    def __init__(self, max_pending=64):
+        self.max_pending = max_pending
+        # seq -> [received, applied, frame, broadcast], oldest first
+        self.pending = collections.OrderedDict()
+        self.histograms = {
+            'received_to_applied': Histogram(),
+            'applied_to_broadcast': Histogram(),
+            'broadcast_to_ack': Histogram(),
+            'total': Histogram(),
+        }
+        self.acked = 0
+        self.lost = 0
+
+    def received(self, seq, now):
+        if len(self.pending) >= self.max_pending:
+            # The client stopped acknowledging, forget the oldest command
+            self.pending.popitem(last=False)
+            self.lost += 1
+        self.pending[seq] = [now, None, None, None]
+
+    def applied(self, frame, now):
+        for trace in self.pending.values():
+            if trace[1] is None:
+                trace[1], trace[2] = now, frame
+
+    def broadcast(self, frame, now):
+        """
+        Returns the last command sent in the frames up to frame, None if there is none
+        """
+        last = None
+        for seq, trace in self.pending.items():
+            if trace[2] is not None and trace[2] <= frame and trace[3] is None:
+                trace[3] = now
+                last = seq
+        return last
+
+    def ack(self, seq, now):
+        """
+        The echo of seq reached the client, so did the echoes of the commands before it
+        """
+        if seq not in self.pending:
+            return
+        while self.pending:
+            current, (received, applied, _, broadcast) = self.pending.popitem(last=False)
+            if broadcast is not None:
+                self.histograms['received_to_applied'].add(applied - received)
+                self.histograms['applied_to_broadcast'].add(broadcast - applied)
+                self.histograms['broadcast_to_ack'].add(now - broadcast)
+                self.histograms['total'].add(now - received)
+                self.acked += 1
+            if current == seq:
+                break
+
+    def stats(self):
+        stats = dict((name, histogram.buckets()) for name, histogram in self.histograms.items())
+        stats.update({
+            'max_total': self.histograms['total'].max,
+            'acked': self.acked,
+            'lost': self.lost,
+            'pending': len(self.pending),
+        })
+        return stats
@@ -0,0 +1,136 @@
+import time
+import collections
+import gevent
+from gevent.event import Event
+from . import protocol
+
+# What to do when the queue of an observer is full
+DROP_FRAMES = 'drop'            # forget the oldest frames not sent yet
+SEND_SNAPSHOT = 'snapshot'      # forget every frame not sent yet and send a fresh arena instead
+DISCONNECT = 'disconnect'       # close the connection
+
+POLICIES = (DROP_FRAMES, SEND_SNAPSHOT, DISCONNECT)
+
+# Client classes, each one receives the frames at its own rate
+PLAYER = 'player'
+SPECTATOR = 'spectator'
+
+ROLES = (PLAYER, SPECTATOR)
+
+
+class Observer(object):
+    """
+    A /receive client with its own bounded outbound queue.
+    The queue is drained by a greenlet of the observer, so the game loop
+    only enqueues payloads and never blocks on a slow connection.
+    """
+
+    def __init__(self, socket, protocol_name=protocol.JSON, max_queue=64,
+                 policy=DROP_FRAMES, resync=None, on_close=None, role=SPECTATOR):
+        """
+        role : client class of the observer, PLAYER or SPECTATOR
+        resync : function returning a fresh arena payload for this observer,
+                 used by the SEND_SNAPSHOT policy
+        on_close : function called with the observer once it is closed
+        """
+        if policy not in POLICIES:
+            raise ValueError('Unknown queue policy {}'.format(policy))
+        self.socket = socket
+        self.protocol = protocol_name
+        self.role = role
+        self.max_queue = max_queue
+        self.policy = policy
+        self.resync = resync
+        self.on_close = on_close
+        self.closed = False
+
+        # (payload, droppable, enqueue time)
+        self.queue = collections.deque()
+        self.ready = Event()
+
+        # Lag metrics
+        self.sent_messages = 0
+        self.sent_bytes = 0
+        self.dropped_messages = 0
+        self.resyncs = 0
+        self.last_lag = 0.
+        self.max_lag = 0.
+
+        self.greenlet = gevent.spawn(self.drain)
+
+    def put(self, payload, droppable=False):
+        """
+        Queue a payload, droppable ones are frames that may be skipped under backpressure
+        """
+        if self.closed:
+            return
+        if len(self.queue) >= self.max_queue:
+            self.on_full()
+            if self.closed:
+                return
+        self.queue.append((payload, droppable, time.time()))
+        self.ready.set()
+
+    def on_full(self):
+        if self.policy == DISCONNECT:
+            self.close()
+        elif self.policy == DROP_FRAMES:
+            for i, (_, droppable, _) in enumerate(self.queue):
+                if droppable:
+                    del self.queue[i]
+                    self.dropped_messages += 1
+                    break
+        elif self.policy == SEND_SNAPSHOT:
+            kept = [item for item in self.queue if not item[1]]
+            self.dropped_messages += len(self.queue) - len(kept)
+            self.queue = collections.deque(kept)
+            if self.resync is not None:
+                # Droppable too, a newer snapshot replaces it if the queue fills up again
+                self.resyncs += 1
+                self.queue.append((self.resync(self), True, time.time()))
+
+    def drain(self):
+        while not self.closed:
+            if not self.queue:
+                self.ready.clear()
+                self.ready.wait()
+                continue
+            payload, _, queued_at = self.queue.popleft()
+            try:
+                self.socket.send(payload)
+            except Exception:
+                self.close()
+                return
+            self.sent_messages += 1
+            self.sent_bytes += len(payload)
+            self.last_lag = time.time() - queued_at
+            self.max_lag = max(self.max_lag, self.last_lag)
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        self.queue.clear()
+        self.ready.set()
+        # Ends the receive loop of the connection, a disconnected client is then collected
+        try:
+            self.socket.close()
+        except Exception:
+            # Already closed, or broken
+            pass
+        if self.on_close is not None:
+            self.on_close(self)
+
+    def stats(self):
+        return {
+            'protocol': self.protocol,
+            'role': self.role,
+            'queued': len(self.queue),
+            'sent_messages': self.sent_messages,
+            'sent_bytes': self.sent_bytes,
+            'dropped_messages': self.dropped_messages,
+            'resyncs': self.resyncs,
+            'last_lag': self.last_lag,
+            'max_lag': self.max_lag,
+            'oldest_queued': time.time() - self.queue[0][2] if self.queue else 0.,
+        }
@@ -0,0 +1,101 @@
+import math
+import gevent
+from .zatacka import Zatacka
+from .recording import MatchReader
+from .scheduler import SKIP
+
+
+class PlaybackZatacka(Zatacka):
+    """
+    Plays a recorded match to the observers, like a live game
+    The arena is rebuilt tick by tick from the recorded positions, so the
+    observers joining during the playback get the usual arena snapshot.
+    """
+
+    # A playback is never worth catching up
+    tick_policy = SKIP
+    # Bounds of the playback speed
+    min_speed = 0.1
+    max_speed = 16.
+
+    def __init__(self, path, speed=1., loop=True):
+        """
+        speed : playback speed, 2 plays the match twice as fast
+        loop : play the match again once it is over
+        """
+        self.recording = MatchReader(path)
+        super(PlaybackZatacka, self).__init__(self.recording.width, self.recording.height,
+                                              seed=self.recording.seed)
+        self.loop = loop
+        self.set_speed(speed)
+        self.tick = 0
+
+    def set_speed(self, speed):
+        """
+        Clamp the speed to [min_speed, max_speed], anything else than a number plays at 1
+        """
+        try:
+            speed = float(speed)
+        except (TypeError, ValueError):
+            speed = 1.
+        if math.isnan(speed):
+            speed = 1.
+        self.speed = speed = min(max(speed, self.min_speed), self.max_speed)
+        self.scheduler.tick_time = self.frame_time / speed
+        self.scheduler.reset()
+
+    def scores_message(self):
+        players = [{
+            'id': player['id'],
+            'name': player['name'],
+            'score': 0,
+            'color': player['color'],
+                    } for player in self.recording.players]
+        return {'type': 'players', 'content': players}
+
+    def register_player(self):
+        # Nobody plays a recorded match
+        return None
+
+    def seek(self, tick):
+        """
+        Go to a tick, the arena is rebuilt from the keyframe before it
+        """
+        self.grid = self.new_grid()
+        self.recording.arena_at(self.grid, tick)
+        self.tick = tick + 1
+        self.frame = tick
+        self.scheduler.reset()
+        for steps in self.pending_steps.values():
+            del steps[:]
+        self.broadcast({'type': 'restart'})
+        for observer in list(self.clients):
+            self.send_payload(observer, self.arena_payload(observer))
+
+    def play_tick(self):
+        step = self.recording.step(self.tick)
+        self.recording.stamp(self.grid, self.tick)
+        self.frame = step['frame']
+        self.tick += 1
+        self.publish_step(step, flush=bool(step['died']) or self.tick == len(self.recording))
+        self.wait_next_frame()
+
+    def run(self):
+        while True:
+            self.grid = self.new_grid()
+            self.game_history.clear()
+            self.scheduler.reset()
+            self.frame = -1
+            self.tick = 0
+            self.announce_new_game()
+
+            while self.tick < len(self.recording):
+                self.play_tick()
+
+            if not self.loop:
+                return
+            gevent.sleep(3)
+
+    def stop(self):
+        super(PlaybackZatacka, self).stop()
+        self.recording.close()
@@ -1,4 +1,5 @@
 import json
+import time
 from .abstract_player import AbstractPlayer, Snake, COLORS
 
 
@@ -11,10 +12,12 @@ class Player(AbstractPlayer):
         self.name = 'guest'
         self.command = None
         self.color = COLORS[id - 1]
+        # LatencyTracer of the commands, when the game traces them
+        self.tracer = None
 
-    def spawn(self, x, y):
+    def spawn(self, x, y, direction=None):
         self.alive = True
-        self.snake = Snake(self.id, x, y)
+        self.snake = Snake(self.id, x, y, direction)
 
     def process(self, message, game_state):
         message = json.loads(message)
@@ -23,20 +26,32 @@ class Player(AbstractPlayer):
         if 'command' in message:
             if message['command'] in ('left', 'right', 'straight'):
                 self.command = message['command']
+        if self.tracer is not None:
+            if 'seq' in message:
+                self.tracer.received(message['seq'], time.time())
+            if 'ack' in message:
+                self.tracer.ack(message['ack'], time.time())
 
     def update(self, grid):
         if not self.alive:
             return
+        self.steer()
+        self.snake.move(grid.width, grid.height)
+        if self.snake.collision(grid):
+            self.alive = False
+        self.snake.update_grid(grid)
+        self.after_update(grid)
+
+    def steer(self):
         if self.command is not None:
             print("Player {} did {}".format(self.id, self.command))
         if self.command == 'left':
             self.snake.turn_left()
         if self.command == 'right':
             self.snake.turn_right()
-        self.snake.move(grid.width, grid.height)
-        if self.snake.collision(grid):
-            self.alive = False
-        self.snake.update_grid(grid)
+
+    def after_update(self, grid):
+        pass
 
     def get_snake(self):
         return {'id': self.id, 'x': self.snake.x, 'y': self.snake.y, 'color': self.color}
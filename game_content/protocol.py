@@ -0,0 +1,125 @@
+"""
+Encodings of the messages sent to the observers of /receive
+
+Every observer picks a protocol when it connects :
+- json : every message is a JSON text, the historical format
+- binary : step, bundle and arena messages are packed fixed-width records, the
+  rare control messages (size, players, restart...) stay JSON texts
+"""
+import json
+import struct
+import numpy
+
+JSON = 'json'
+BINARY = 'binary'
+
+# Binary message types, first byte of every binary message
+STEP = 1
+ARENA = 2
+BUNDLE = 3
+
+# type, number of snakes, frame number
+STEP_HEADER = struct.Struct('<BBI')
+# id, event flags, quantized x, quantized y
+SNAKE_RECORD = struct.Struct('<BBHH')
+
+# type, number of steps, frame number of the last step, followed by the steps
+BUNDLE_HEADER = struct.Struct('<BBI')
+
+# type, frame number, number of runs
+ARENA_HEADER = struct.Struct('<BII')
+# x, y, length along y, owner
+ARENA_RUN = numpy.dtype([('x', '<u2'), ('y', '<u2'), ('length', '<u2'), ('owner', 'u1')])
+
+# Event flags of a snake record
+DIED = 1
+
+
+def frame_scale(width, height):
+    """
+    Positions are sent as x * scale on 16 bits, use the finest scale that fits the arena
+    """
+    return max(1, min(64, 0xffff // max(width, height)))
+
+
+class JsonCodec(object):
+    name = JSON
+
+    def encode(self, message):
+        return json.dumps(message)
+
+
+class BinaryCodec(JsonCodec):
+    name = BINARY
+
+    def __init__(self, scale):
+        self.scale = scale
+
+    def encode(self, message):
+        if message['type'] == 'step':
+            return self.encode_step(message)
+        if message['type'] == 'bundle':
+            return self.encode_bundle(message)
+        if message['type'] == 'arena':
+            return self.encode_arena(message)
+        return JsonCodec.encode(self, message)
+
+    def encode_step(self, message):
+        snakes = message['content']
+        died = message.get('died', ())
+        chunks = [STEP_HEADER.pack(STEP, len(snakes), message.get('frame', 0))]
+        for snake in snakes:
+            chunks.append(SNAKE_RECORD.pack(
+                snake['id'],
+                DIED if snake['id'] in died else 0,
+                self.quantize(snake['x']),
+                self.quantize(snake['y'])))
+        return b''.join(chunks)
+
+    def encode_bundle(self, message):
+        steps = message['steps']
+        return BUNDLE_HEADER.pack(BUNDLE, len(steps), message['frame']) + \
+            b''.join(self.encode_step(step) for step in steps)
+
+    def encode_arena(self, message):
+        runs = numpy.asarray(message['runs']).reshape(-1, 4)
+        records = numpy.zeros(len(runs), dtype=ARENA_RUN)
+        for i, name in enumerate(ARENA_RUN.names):
+            records[name] = runs[:, i]
+        return ARENA_HEADER.pack(ARENA, message['frame'], len(runs)) + records.tobytes()
+
+    def decode_arena(self, payload):
+        _, frame, count = ARENA_HEADER.unpack_from(payload)
+        records = numpy.frombuffer(payload, dtype=ARENA_RUN, count=count, offset=ARENA_HEADER.size)
+        runs = numpy.column_stack([records[name] for name in ARENA_RUN.names])
+        return {'type': 'arena', 'frame': frame, 'runs': runs.ravel().tolist()}
+
+    def quantize(self, value):
+        return min(max(int(round(value * self.scale)), 0), 0xffff)
+
+    def decode_step(self, payload):
+        """
+        Inverse of encode_step, without the colors
+        """
+        _, count, frame = STEP_HEADER.unpack_from(payload)
+        snakes, died = [], []
+        for i in range(count):
+            id_, flags, x, y = SNAKE_RECORD.unpack_from(payload, STEP_HEADER.size + i * SNAKE_RECORD.size)
+            snakes.append({'id': id_, 'x': x / self.scale, 'y': y / self.scale})
+            if flags & DIED:
+                died.append(id_)
+        return {'type': 'step', 'frame': frame, 'content': snakes, 'died': died}
+
+    def decode_bundle(self, payload):
+        _, count, frame = BUNDLE_HEADER.unpack_from(payload)
+        steps = []
+        offset = BUNDLE_HEADER.size
+        for _ in range(count):
+            size = STEP_HEADER.size + payload[offset + 1] * SNAKE_RECORD.size
+            steps.append(self.decode_step(payload[offset:offset + size]))
+            offset += size
+        return {'type': 'bundle', 'frame': frame, 'steps': steps}
+
+
+def make_codecs(width, height):
+    return {JSON: JsonCodec(), BINARY: BinaryCodec(frame_scale(width, height))}
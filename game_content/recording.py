@@ -0,0 +1,255 @@
+"""
+Recorded matches
+
+A recording is an append-only file :
+- a header : arena size, seed, snake radius and the players with their
+  color, name and spawn position
+- one fixed size TICK chunk per tick, with the position and flags of every player
+- every keyframe_every ticks, a KEYFRAME chunk with the run-length encoded
+  arena after that tick (see arena_snapshot.py)
+- once the game is over, an index of the offsets of every chunk and a footer
+
+The reader maps the file and reaches any tick in O(1) through the index.
+A recording cut short (server killed mid-game) has no index, the reader
+then rebuilds it with one pass over the chunks.
+"""
+import os
+import mmap
+import struct
+import numpy
+from . import engine
+from . import protocol
+from .arena_snapshot import ArenaSnapshot, run_cells, RUN_COLUMNS
+
+MAGIC = b'ZREC'
+INDEX_MAGIC = b'ZIDX'
+VERSION = 1
+
+# magic, version, width, height, seed (-1 for none), number of players, radius, keyframe interval
+HEADER = struct.Struct('<4sBHHqBBI')
+# id, color, name, spawn x, spawn y
+PLAYER = struct.Struct('<B8s16sdd')
+PLAYER_NAME_BYTES = 16
+# index offset, number of ticks, number of keyframes, magic
+FOOTER = struct.Struct('<QII4s')
+
+# Chunk kinds, first byte of every chunk
+TICK = 1
+KEYFRAME = 2
+
+# kind, frame, number of runs, followed by the runs as protocol.ARENA_RUN records
+KEYFRAME_HEADER = struct.Struct('<BII')
+
+# Flags of a player in a tick
+MOVED = 1   # moved and stamped its trail during the tick
+DIED = 2    # collided during the tick
+
+SLOT = numpy.dtype([('id', 'u1'), ('flags', 'u1'), ('x', '<f8'), ('y', '<f8')])
+
+
+def truncate_utf8(text, size):
+    """
+    At most size bytes of the utf-8 encoding of text, without cutting a character
+    """
+    return text.encode('utf-8')[:size].decode('utf-8', 'ignore').encode('utf-8')
+
+
+def tick_dtype(nb_players):
+    return numpy.dtype([('kind', 'u1'), ('frame', '<u4'), ('snakes', SLOT, (nb_players,))])
+
+
+class MatchRecorder(object):
+    """
+    Writes one game to a recording, call record() once per tick then close()
+    """
+
+    def __init__(self, path, width, height, players, seed=None, keyframe_every=256):
+        """
+        players : the players of the game, already spawned
+        """
+        self.path = path
+        self.players = list(players)
+        self.keyframe_every = keyframe_every
+        self.tick_type = tick_dtype(len(self.players))
+        self.tick_offsets = []
+        self.keyframe_offsets = []
+        self.arena = ArenaSnapshot()
+
+        self.file = open(path, 'wb')
+        radius = self.players[0].snake.radius if self.players else 0
+        self.file.write(HEADER.pack(MAGIC, VERSION, width, height, -1 if seed is None else seed,
+                                    len(self.players), radius, keyframe_every))
+        for player in self.players:
+            self.file.write(PLAYER.pack(player.id, player.color.encode('ascii'),
+                                        truncate_utf8(player.name, PLAYER_NAME_BYTES),
+                                        player.snake.x, player.snake.y))
+
+    def record(self, frame, alive_players, grid):
+        """
+        alive_players : the players that moved this tick, the dead ones of this tick included
+        """
+        tick = numpy.zeros((), dtype=self.tick_type)
+        tick['kind'] = TICK
+        tick['frame'] = frame
+        for i, player in enumerate(self.players):
+            slot = tick['snakes'][i]
+            slot['id'] = player.id
+            slot['x'] = player.snake.x
+            slot['y'] = player.snake.y
+            if player in alive_players:
+                slot['flags'] = MOVED if player.alive else MOVED | DIED
+        self.tick_offsets.append(self.file.tell())
+        self.file.write(tick.tobytes())
+
+        if frame % self.keyframe_every == 0:
+            runs = self.arena.update(grid).runs()
+            records = numpy.zeros(len(runs), dtype=protocol.ARENA_RUN)
+            for i, name in enumerate(protocol.ARENA_RUN.names):
+                records[name] = runs[:, i]
+            self.keyframe_offsets.append(self.file.tell())
+            self.file.write(KEYFRAME_HEADER.pack(KEYFRAME, frame, len(runs)))
+            self.file.write(records.tobytes())
+
+    def close(self):
+        if self.file is None:
+            return
+        index_offset = self.file.tell()
+        self.file.write(numpy.asarray(self.tick_offsets, dtype='<u8').tobytes())
+        self.file.write(numpy.asarray(self.keyframe_offsets, dtype='<u8').tobytes())
+        self.file.write(FOOTER.pack(index_offset, len(self.tick_offsets),
+                                    len(self.keyframe_offsets), INDEX_MAGIC))
+        self.file.close()
+        self.file = None
+
+
+class MatchReader(object):
+    """
+    Memory mapped recording, ticks are read without loading the file
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, 'rb')
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, self.width, self.height, seed, nb_players, self.radius, \
+            self.keyframe_every = HEADER.unpack_from(self.map)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError('{} is not a recording'.format(path))
+        self.seed = None if seed < 0 else seed
+
+        self.players = []
+        for i in range(nb_players):
+            id_, color, name, x, y = PLAYER.unpack_from(self.map, HEADER.size + i * PLAYER.size)
+            self.players.append({'id': id_, 'color': color.rstrip(b'\0').decode('ascii'),
+                                 'name': name.rstrip(b'\0').decode('utf-8'), 'x': x, 'y': y})
+        self.tick_type = tick_dtype(nb_players)
+        self.tick_offsets, self.keyframe_offsets = self.read_index()
+
+    def read_index(self):
+        if len(self.map) >= FOOTER.size:
+            index_offset, nb_ticks, nb_keyframes, magic = FOOTER.unpack_from(
+                self.map, len(self.map) - FOOTER.size)
+            if magic == INDEX_MAGIC:
+                offsets = numpy.frombuffer(self.map, dtype='<u8', count=nb_ticks + nb_keyframes,
+                                           offset=index_offset)
+                return offsets[:nb_ticks], offsets[nb_ticks:]
+        return self.scan()
+
+    def scan(self):
+        """
+        Offsets of the chunks of a recording without index
+        """
+        tick_offsets, keyframe_offsets = [], []
+        offset = HEADER.size + len(self.players) * PLAYER.size
+        while offset < len(self.map):
+            kind = self.map[offset]
+            if kind == TICK and offset + self.tick_type.itemsize <= len(self.map):
+                tick_offsets.append(offset)
+                offset += self.tick_type.itemsize
+            elif kind == KEYFRAME and offset + KEYFRAME_HEADER.size <= len(self.map):
+                _, _, nb_runs = KEYFRAME_HEADER.unpack_from(self.map, offset)
+                keyframe_offsets.append(offset)
+                offset += KEYFRAME_HEADER.size + nb_runs * protocol.ARENA_RUN.itemsize
+            else:
+                break
+        return numpy.array(tick_offsets, dtype='<u8'), numpy.array(keyframe_offsets, dtype='<u8')
+
+    def close(self):
+        # The index arrays are views on the map, drop them first
+        self.tick_offsets = self.keyframe_offsets = None
+        self.map.close()
+        self.file.close()
+
+    def __len__(self):
+        return len(self.tick_offsets)
+
+    def tick(self, index):
+        """
+        Raw record of a tick, frame and snakes
+        """
+        return numpy.frombuffer(self.map, dtype=self.tick_type, count=1,
+                                offset=int(self.tick_offsets[index]))[0]
+
+    def step(self, index):
+        """
+        Step message of a tick, as built by Zatacka.run_display
+        """
+        tick = self.tick(index)
+        colors = dict((player['id'], player['color']) for player in self.players)
+        snakes = tick['snakes'][tick['snakes']['flags'] & MOVED != 0]
+        return {'type': 'step', 'frame': int(tick['frame']),
+                'content': [{'id': int(snake['id']), 'x': float(snake['x']), 'y': float(snake['y']),
+                             'color': colors[snake['id']]} for snake in snakes],
+                'died': [int(snake['id']) for snake in snakes if snake['flags'] & DIED]}
+
+    def keyframe(self, index):
+        """
+        Frame and runs (n x 4) of a keyframe
+        """
+        offset = int(self.keyframe_offsets[index])
+        _, frame, nb_runs = KEYFRAME_HEADER.unpack_from(self.map, offset)
+        records = numpy.frombuffer(self.map, dtype=protocol.ARENA_RUN, count=nb_runs,
+                                   offset=offset + KEYFRAME_HEADER.size)
+        runs = numpy.column_stack([records[name] for name in protocol.ARENA_RUN.names])
+        return frame, runs.reshape(-1, RUN_COLUMNS)
+
+    def stamp(self, grid, index):
+        """
+        Write on the grid the trails left during a tick, at the positions of the previous tick
+        """
+        moved = self.tick(index)['snakes']
+        moved = moved[moved['flags'] & MOVED != 0]
+        if not len(moved):
+            return
+        if index == 0:
+            spawns = dict((player['id'], (player['x'], player['y'])) for player in self.players)
+            x = numpy.array([spawns[id_][0] for id_ in moved['id']])
+            y = numpy.array([spawns[id_][1] for id_ in moved['id']])
+        else:
+            previous = self.tick(index - 1)['snakes']
+            order = [numpy.flatnonzero(previous['id'] == id_)[0] for id_ in moved['id']]
+            x, y = previous['x'][order], previous['y'][order]
+        trail_xs, trail_ys, valid = engine.trail_cells(x, y, numpy.full(len(moved), self.radius),
+                                                       self.radius)
+        trail_xs, trail_ys = grid.wrap_coordinates(trail_xs, trail_ys)
+        engine.stamp_trails(grid, moved['id'], trail_xs, trail_ys, valid)
+
+    def arena_at(self, grid, index):
+        """
+        Fill an empty grid with the arena after a tick, from the last keyframe before it
+        """
+        start = 0
+        if len(self.keyframe_offsets) and self.keyframe_every:
+            keyframe = min(index // self.keyframe_every, len(self.keyframe_offsets) - 1)
+            frame, runs = self.keyframe(keyframe)
+            # Through set_many, the cells of a ChunkedGrid are not one array
+            xs, ys, owners = run_cells(runs)
+            grid.set_many(xs, ys, owners)
+            start = frame + 1
+        for i in range(start, index + 1):
+            self.stamp(grid, i)
+
+
+def recording_path(directory, game_number, timestamp):
+    return os.path.join(directory, 'match-{}-{}.zrec'.format(int(timestamp), game_number))
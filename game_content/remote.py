@@ -0,0 +1,293 @@
+"""
+Zatacka simulated in a process of its own
+
+The web worker only keeps the connections : RemoteZatacka starts a child
+process running the game loop, the grid lives in shared memory and the
+messages of the game come through a pipe, to be fanned out to the
+observers of the worker. The bots of the game then can't starve the
+sockets, and the network can't make the simulation jitter.
+"""
+import os
+import socket
+import struct
+import collections
+import multiprocessing
+import numpy
+import gevent
+from gevent.event import AsyncResult, Event
+from gevent.socket import wait_read, wait_write
+from multiprocessing import shared_memory
+from multiprocessing.reduction import ForkingPickler
+from .zatacka import Zatacka, Grid
+
+# Forking would copy the gevent hub and the sockets of the worker
+context = multiprocessing.get_context('spawn')
+
+
+def shared_grid(memory, width, height):
+    """
+    Grid whose cells are the shared memory block
+    """
+    grid = Grid(width, height)
+    grid.grid = numpy.ndarray((width, height), dtype=numpy.uint8, buffer=memory.buf)
+    return grid
+
+
+class SimulatedZatacka(Zatacka):
+    """
+    Game loop of the child process, publishes its messages on the pipe
+    """
+
+    # Send the tick statistics that often, in frames
+    stats_frames = 100
+    # Messages waiting for the pipe, the oldest frames are dropped past it
+    outbox_size = 64
+
+    def __init__(self, connection, memory_name, width, height, seed=None, recording_dir=None):
+        super(SimulatedZatacka, self).__init__(width, height, seed=seed, recording_dir=recording_dir)
+        self.connection = connection
+        self.memory = shared_memory.SharedMemory(name=memory_name)
+        self.shared_grid = shared_grid(self.memory, width, height)
+        # connection.send blocks the whole process when the pipe is full : the
+        # messages are framed like Connection.send does and written without
+        # blocking on a socket of the same pipe by send_outbox
+        self.socket = socket.socket(fileno=os.dup(connection.fileno()))
+        # (framed message, droppable)
+        self.outbox = collections.deque()
+        self.outbox_ready = Event()
+        self.dropped_messages = 0
+
+    def new_grid(self):
+        # Games go on in the same shared block, the worker never has to map a new one
+        self.shared_grid.grid[:] = 0
+        self.shared_grid.release()
+        return self.shared_grid
+
+    def broadcast(self, data, role=None):
+        self.post(('broadcast', data, role), droppable=data['type'] in ('step', 'bundle'))
+
+    def run_display(self, alive_players):
+        super(SimulatedZatacka, self).run_display(alive_players)
+        if self.frame % self.stats_frames == 0:
+            self.post(('stats', self.tick_stats(), self.latency_stats()), droppable=True)
+
+    def post(self, message, droppable=False):
+        """
+        Queue a message for the worker, when the outbox is full the oldest
+        droppable one is forgotten, the others are always kept
+        """
+        if len(self.outbox) >= self.outbox_size:
+            for i, (_, queued_droppable) in enumerate(self.outbox):
+                if queued_droppable:
+                    del self.outbox[i]
+                    self.dropped_messages += 1
+                    break
+        payload = ForkingPickler.dumps(message)
+        self.outbox.append((struct.pack('!i', len(payload)) + payload, droppable))
+        self.outbox_ready.set()
+
+    def send_outbox(self):
+        """
+        Write the outbox to the pipe, waiting for it to drain without blocking the game loop
+        """
+        while True:
+            if not self.outbox:
+                self.outbox_ready.clear()
+                self.outbox_ready.wait()
+                continue
+            data = memoryview(self.outbox.popleft()[0])
+            while data:
+                try:
+                    data = data[self.socket.send(data, socket.MSG_DONTWAIT):]
+                except BlockingIOError:
+                    wait_write(self.socket.fileno())
+                except OSError:
+                    # The worker is gone, so is the game
+                    self.greenlet.kill(block=False)
+                    return
+
+    def listen(self):
+        """
+        Apply the requests of the worker until it closes the pipe
+        """
+        while True:
+            wait_read(self.connection.fileno())
+            try:
+                request = self.connection.recv()
+            except EOFError:
+                break
+            kind = request[0]
+            if kind == 'join':
+                player = self.register_player()
+                self.post(('joined', player.id if player else None, len(self.players)))
+                self.broadcast_players()
+            elif kind == 'command':
+                for player in self.players:
+                    if player.id == request[1]:
+                        player.process(request[2], None)
+            elif kind == 'leave':
+                for player in list(self.players):
+                    if player.id == request[1]:
+                        self.remove_player(player)
+        self.greenlet.kill()
+
+
+def run_simulation(connection, memory_name, width, height, seed, recording_dir, trace_latency):
+    """
+    Entry point of the child process
+    """
+    game = SimulatedZatacka(connection, memory_name, width, height, seed, recording_dir)
+    game.trace_latency = trace_latency
+    game.start()
+    gevent.spawn(game.listen)
+    gevent.spawn(game.send_outbox)
+    try:
+        game.greenlet.join()
+    finally:
+        game.stop_recording()
+        game.socket.close()
+        # The grids are views on the block, drop them first
+        game.grid = game.shared_grid = None
+        game.memory.close()
+
+
+class RemotePlayer(object):
+    """
+    Stand-in of a player of the child process, forwards its messages
+    Its commands are traced in the child process, if at all.
+    """
+
+    def __init__(self, game, id):
+        self.game = game
+        self.id = id
+        self.is_human = True
+        self.tracer = None
+
+    def process(self, message, game_state):
+        self.game.request(('command', self.id, message))
+
+
+class RemoteZatacka(Zatacka):
+    """
+    Same interface as Zatacka for the server and the rooms, but the game runs
+    in a child process. The observers stay in this process, with their
+    queues and protocols, and get the messages published by the child.
+    Late joiners get a snapshot of the shared grid, which the child may be
+    writing at the same time : the next frames draw over any torn cell.
+    """
+
+    def __init__(self, width=200, height=200, seed=None, recording_dir=None):
+        super(RemoteZatacka, self).__init__(width, height, seed=seed, recording_dir=recording_dir)
+        self.memory = None
+        self.process = None
+        self.connection = None
+        self.grid = None
+        self.frame = 0
+        self.nb_players = 0
+        self.players_message = {'type': 'players', 'content': []}
+        self.last_tick_stats = {}
+        self.last_latency_stats = {}
+        # Replies of the child to the joins, in order
+        self.pending_joins = collections.deque()
+
+    def start(self):
+        self.memory = shared_memory.SharedMemory(create=True, size=self.width * self.height)
+        self.grid = shared_grid(self.memory, self.width, self.height)
+        self.grid.grid[:] = 0
+        self.connection, child_connection = context.Pipe()
+        self.process = context.Process(target=run_simulation,
+                                       args=(child_connection, self.memory.name,
+                                             self.width, self.height, self.seed,
+                                             self.recording_dir, self.trace_latency))
+        self.process.daemon = True
+        self.process.start()
+        child_connection.close()
+        self.greenlet = gevent.spawn(self.listen)
+        return self.greenlet
+
+    def stop(self):
+        super(RemoteZatacka, self).stop()
+        self.close_process()
+        if self.memory is not None:
+            # The grid is a view on the block, drop it first
+            self.grid = None
+            self.arena_snapshot.grid = None
+            self.memory.close()
+            self.memory.unlink()
+            self.memory = None
+
+    def close_process(self):
+        """
+        Stop the child process if it still runs, the joins waiting for it get None
+        """
+        while self.pending_joins:
+            self.pending_joins.popleft().set(None)
+        if self.process is not None:
+            self.connection.close()
+            self.process.join(1)
+            if self.process.is_alive():
+                self.process.terminate()
+                self.process.join()
+            self.process = None
+
+    def request(self, message):
+        if self.process is not None:
+            self.connection.send(message)
+
+    def listen(self):
+        """
+        Fan out the messages of the child process
+        """
+        while True:
+            wait_read(self.connection.fileno())
+            try:
+                message = self.connection.recv()
+            except EOFError:
+                # The child is gone, nobody joins this game anymore
+                self.close_process()
+                return
+            kind = message[0]
+            if kind == 'broadcast':
+                data, role = message[1], message[2]
+                if 'frame' in data:
+                    self.frame = data['frame']
+                if data['type'] == 'players':
+                    self.players_message = data
+                    self.nb_players = len(data['content'])
+                self.broadcast(data, role)
+            elif kind == 'joined':
+                self.nb_players = message[2]
+                self.pending_joins.popleft().set(message[1])
+            elif kind == 'stats':
+                self.last_tick_stats, self.last_latency_stats = message[1], message[2]
+
+    def register_player(self):
+        if self.process is None:
+            return None
+        reply = AsyncResult()
+        self.pending_joins.append(reply)
+        self.request(('join',))
+        player_id = reply.get()
+        if player_id is None:
+            return None
+        player = RemotePlayer(self, player_id)
+        self.players.append(player)
+        return player
+
+    def remove_player(self, player):
+        if player in self.players:
+            self.players.remove(player)
+        self.request(('leave', player.id))
+
+    @property
+    def is_full(self):
+        return self.nb_players >= self.max_players
+
+    def scores_message(self):
+        return self.players_message
+
+    def tick_stats(self):
+        return self.last_tick_stats
+
+    def latency_stats(self):
+        return self.last_latency_stats
@@ -0,0 +1,122 @@
+import time
+import numpy
+from .bot import BotPlayer
+from .vector_zatacka import ACTIONS
+from . import engine
+
+
+class RolloutBotPlayer(BotPlayer):
+    """
+    Search based bot
+    On each tick it simulates short futures of its own snake starting with
+    each command, and plays the command whose futures survive the longest.
+
+    The search is anytime : batches of rollouts are simulated until the
+    time budget of the tick is spent, so the bot never slows the game loop.
+    The other snakes are seen as the trails already on the grid.
+    A budget smaller than one batch is saved up over the ticks, the bot
+    keeps its last command until it can afford a search.
+    """
+
+    def __init__(self, id, time_budget=0.004, horizon=40, rollouts_per_batch=16, seed=None):
+        super(RolloutBotPlayer, self).__init__(id)
+        self.time_budget = time_budget
+        self.horizon = horizon
+        self.rollouts_per_batch = rollouts_per_batch
+        self.random = numpy.random.RandomState(seed)
+        # Unspent budget, and the time of the last batch of rollouts
+        self.credit = 0.
+        self.batch_time = 0.
+
+        # Search statistics, to tune the budget
+        self.rollouts_last_tick = 0
+        self.total_rollouts = 0
+        self.searched_ticks = 0
+
+    def process(self, message, game_state):
+        '''
+        Bots dont pass message from the interface
+        They process the last state of the grid
+        '''
+        if not self.alive:
+            return
+        grid = game_state
+        snake = self.snake
+
+        # Nothing within reach, no need to search
+        reach = self.horizon * snake.speed + snake.radius
+        if grid.is_region_empty(snake.x - reach, snake.y - reach, snake.x + reach, snake.y + reach):
+            self.command = 'straight'
+            self.rollouts_last_tick = 0
+            return
+
+        self.credit = min(self.credit + self.time_budget, max(self.time_budget, self.batch_time))
+        if self.credit < self.batch_time:
+            self.rollouts_last_tick = 0
+            return
+        deadline = time.time() + self.credit
+
+        best_survival = numpy.full(len(ACTIONS), -1)
+        total_survival = numpy.zeros(len(ACTIONS))
+        nb_rollouts = 0
+        batch_time = 0.
+        # The first batch always runs so there is a decision to take
+        while nb_rollouts == 0 or time.time() + batch_time < deadline:
+            start = time.time()
+            first_actions, survival = self.simulate(grid)
+            batch_time = self.batch_time = time.time() - start
+
+            numpy.maximum.at(best_survival, first_actions, survival)
+            numpy.add.at(total_survival, first_actions, survival)
+            nb_rollouts += len(survival)
+            if (best_survival == self.horizon).all():
+                break
+
+        # Best case survival first, then the average as a tie break
+        mean_survival = total_survival / (nb_rollouts / len(ACTIONS))
+        action = max(range(len(ACTIONS)), key=lambda a: (best_survival[a], mean_survival[a]))
+        self.command = ACTIONS[action]
+
+        # Overspending is paid back on the next ticks
+        self.credit = deadline - time.time()
+        self.rollouts_last_tick = nb_rollouts
+        self.total_rollouts += nb_rollouts
+        self.searched_ticks += 1
+
+    def simulate(self, grid):
+        """
+        Play a batch of random futures, the same number for each first action
+        Each future plays its first action for a random number of ticks, then
+        keeps a random command until the horizon.
+        Returns the first action and the number of ticks survived of each future
+        """
+        snake = self.snake
+        size = self.rollouts_per_batch * len(ACTIONS)
+        first_actions = numpy.repeat(numpy.arange(len(ACTIONS)), self.rollouts_per_batch)
+        switch_ticks = self.random.randint(1, self.horizon + 1, size)
+        next_actions = self.random.randint(0, len(ACTIONS), size)
+
+        x = numpy.full(size, float(snake.x))
+        y = numpy.full(size, float(snake.y))
+        direction = numpy.full(size, float(snake.direction))
+        alive = numpy.ones(size, dtype=bool)
+        survival = numpy.zeros(size, dtype=numpy.int64)
+
+        for tick in range(self.horizon):
+            actions = numpy.where(tick < switch_ticks, first_actions, next_actions)
+            direction += snake.turn_speed * ((actions == 1).astype(float) - (actions == 2))
+            x, y = engine.move(x, y, direction, snake.speed, grid.width, grid.height)
+            sensor_xs, sensor_ys = engine.sensor_cells(x, y, direction, snake.radius)
+            alive &= ~grid.get_many(sensor_xs, sensor_ys).any(axis=-1)
+            if not alive.any():
+                break
+            survival += alive
+
+        return first_actions, survival
+
+    def rollout_stats(self):
+        return {
+            'last_tick': self.rollouts_last_tick,
+            'mean_per_tick': self.total_rollouts / max(self.searched_ticks, 1),
+            'searched_ticks': self.searched_ticks,
+        }
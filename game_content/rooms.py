@@ -0,0 +1,124 @@
+"""
+Many Zatacka games served by one deployment
+
+Each worker process owns a RoomManager. A room id always belongs to the
+same worker : its crc32 modulo the number of workers, so every worker can
+compute the routing table locally. Connections reaching the wrong worker
+are told where the room lives.
+"""
+import itertools
+import zlib
+from .zatacka import Zatacka
+from .observer import SPECTATOR
+
+DEFAULT_ROOM = 'default'
+
+
+class RoomManager(object):
+
+    # Share of a tick the house bots of all the rooms of a worker may spend searching
+    house_bot_share = 0.25
+
+    def __init__(self, factory=Zatacka, worker_id=0, worker_urls=None):
+        """
+        factory : builds the game of a new room
+        worker_id : index of this worker in worker_urls
+        worker_urls : base url of every worker, empty when running a single worker
+        """
+        self.factory = factory
+        self.worker_id = worker_id
+        self.worker_urls = list(worker_urls or [])
+        self.rooms = {}
+        self._room_ids = itertools.count()
+
+    def worker_for(self, room_id):
+        if not self.worker_urls:
+            return self.worker_id
+        return zlib.crc32(room_id.encode('utf-8')) % len(self.worker_urls)
+
+    def is_local(self, room_id):
+        return self.worker_for(room_id) == self.worker_id
+
+    def url_for(self, room_id, path='/'):
+        """
+        Where to find a room, relative to this worker when the room is local
+        """
+        base = '' if self.is_local(room_id) else self.worker_urls[self.worker_for(room_id)]
+        return '{}{}?room={}'.format(base, path, room_id)
+
+    def room(self, room_id, factory=None):
+        """
+        Game of a local room, created and started on first use
+        factory : builds the game of this room instead of the default factory
+        """
+        if not self.is_local(room_id):
+            raise ValueError('Room {} belongs to worker {}'.format(room_id, self.worker_for(room_id)))
+        game = self.rooms.get(room_id)
+        if game is None:
+            game = self.rooms[room_id] = (factory or self.factory)()
+            self.share_bot_budget()
+            game.start()
+            print('created room {}'.format(room_id))
+        return game
+
+    def pick_room(self):
+        """
+        A local room with a free player slot, or the id of a new one
+        """
+        for room_id, game in self.rooms.items():
+            if not game.is_full:
+                return room_id
+        while True:
+            room_id = 'w{}-{}'.format(self.worker_id, next(self._room_ids))
+            if self.is_local(room_id) and room_id not in self.rooms:
+                return room_id
+
+    def join(self, room_id):
+        """
+        Returns the new player, or None when the room is full
+        """
+        return self.room(room_id).register_player()
+
+    def leave(self, room_id, player):
+        game = self.rooms.get(room_id)
+        if game is not None:
+            game.remove_player(player)
+        self.collect(room_id)
+
+    def observe(self, room_id, socket, protocol_name, role=SPECTATOR, factory=None):
+        return self.room(room_id, factory).register_observer(socket, protocol_name, role)
+
+    def stop_observing(self, room_id, observer):
+        game = self.rooms.get(room_id)
+        if game is not None:
+            game.remove_observer(observer)
+        self.collect(room_id)
+
+    def collect(self, room_id):
+        """
+        Stop and forget the room once nobody plays or watches it anymore
+        """
+        game = self.rooms.get(room_id)
+        if game is not None and game.is_empty:
+            game.stop()
+            del self.rooms[room_id]
+            self.share_bot_budget()
+            print('closed room {}'.format(room_id))
+
+    def share_bot_budget(self):
+        """
+        The rooms run in one greenlet hub, more rooms give each house bot less time
+        """
+        for game in self.rooms.values():
+            game.set_house_bot_budget(self.house_bot_share * game.frame_time / len(self.rooms))
+
+    def stats(self):
+        stats = {}
+        for room_id, game in self.rooms.items():
+            ticks = game.tick_stats()
+            stats[room_id] = {'players': len(game.players), 'observers': len(game.clients),
+                              'missed_deadlines': ticks.get('missed_deadlines', 0),
+                              'overloaded': ticks.get('overloaded', False),
+                              'latency': game.latency_stats(),
+                              'observer_queues': game.observer_stats()}
+        return stats
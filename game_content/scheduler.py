@@ -0,0 +1,133 @@
+import time
+import bisect
+import collections
+import gevent
+
+# What to do with the ticks whose deadline is already passed
+CATCH_UP = 'catch_up'   # run every late tick back to back until the schedule is met again
+CAPPED = 'capped'       # same, but never more than max_catch_up ticks behind, the rest is forgotten
+SKIP = 'skip'           # start the schedule again from the late tick, nothing is caught up
+
+POLICIES = (CATCH_UP, CAPPED, SKIP)
+
+
+class Histogram(object):
+    """
+    Counts of durations in fixed buckets, bounds in seconds
+    """
+
+    default_bounds = (0.0005, 0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1.)
+
+    def __init__(self, bounds=None):
+        self.bounds = tuple(bounds or self.default_bounds)
+        # The last bucket holds everything above the last bound
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.total = 0
+        self.max = 0.
+
+    def add(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.total += 1
+        self.max = max(self.max, value)
+
+    def buckets(self):
+        labels = ['<={}'.format(bound) for bound in self.bounds] + ['>{}'.format(self.bounds[-1])]
+        return dict(zip(labels, self.counts))
+
+
+class TickScheduler(object):
+    """
+    Paces the ticks of a game on the wall clock.
+    Tick n is due at origin + n * tick_time. When a tick is late the policy
+    decides whether the missed ticks are caught up, and every missed deadline
+    is recorded so an overloaded game can be told from a healthy one.
+    """
+
+    def __init__(self, tick_time, policy=CAPPED, max_catch_up=5, overload_window=100,
+                 clock=time.time, sleep=gevent.sleep):
+        """
+        max_catch_up : ticks the CAPPED policy may fall behind
+        overload_window : number of recent ticks overloaded() looks at
+        """
+        if policy not in POLICIES:
+            raise ValueError('Unknown tick policy {}'.format(policy))
+        self.tick_time = tick_time
+        self.policy = policy
+        self.max_catch_up = max_catch_up
+        self.clock = clock
+        self.sleep = sleep
+
+        self.origin = None
+        self.last_wake = None
+        self.recent_misses = collections.deque(maxlen=overload_window)
+
+        # Time spent in a tick, between two waits
+        self.tick_durations = Histogram()
+        # Delay of each wake up after its deadline
+        self.jitter = Histogram()
+        self.ticks = 0
+        self.missed_deadlines = 0
+        self.skipped_time = 0.
+
+    def reset(self):
+        """
+        The next tick waited for becomes the start of a new schedule
+        """
+        self.origin = None
+        self.last_wake = None
+
+    def deadline(self, tick):
+        return self.origin + tick * self.tick_time
+
+    def wait(self, tick):
+        """
+        Sleep until tick is due, or return right away if it is late
+        """
+        now = self.clock()
+        if self.origin is None:
+            self.origin = now - tick * self.tick_time
+        if self.last_wake is not None:
+            self.tick_durations.add(now - self.last_wake)
+        self.ticks += 1
+
+        late = now - self.deadline(tick)
+        missed = late > 0
+        self.recent_misses.append(missed)
+        if missed:
+            self.missed_deadlines += 1
+            if self.policy == SKIP:
+                self.rebase(late)
+            elif self.policy == CAPPED and late > self.max_catch_up * self.tick_time:
+                self.rebase(late - self.max_catch_up * self.tick_time)
+        # Even a late tick yields, so the other greenlets are not starved
+        self.sleep(max(0., -late))
+
+        self.last_wake = self.clock()
+        self.jitter.add(max(0., self.last_wake - self.deadline(tick)))
+
+    def rebase(self, delay):
+        """
+        Move the schedule delay seconds later, the ticks in between are never caught up
+        """
+        self.origin += delay
+        self.skipped_time += delay
+
+    def overloaded(self):
+        """
+        Whether most of the recent ticks missed their deadline
+        """
+        return len(self.recent_misses) > 0 and \
+            2 * sum(self.recent_misses) > len(self.recent_misses)
+
+    def stats(self):
+        return {
+            'policy': self.policy,
+            'ticks': self.ticks,
+            'missed_deadlines': self.missed_deadlines,
+            'skipped_time': self.skipped_time,
+            'overloaded': self.overloaded(),
+            'tick_durations': self.tick_durations.buckets(),
+            'max_tick_duration': self.tick_durations.max,
+            'jitter': self.jitter.buckets(),
+            'max_jitter': self.jitter.max,
+        }
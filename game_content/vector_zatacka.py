@@ -0,0 +1,129 @@
+import numpy
+from . import engine
+
+# Index of each command in the action arrays given to VectorZatacka.step
+ACTIONS = ('straight', 'left', 'right')
+
+
+class VectorZatacka(object):
+    """
+    Many independent games of Zatacka stepped together, for training.
+
+    The arenas are stacked in one (games x width x height) array, indexed
+    as grid[game][x][y] like Grid, and the snakes of every game are kept in
+    (games x players) arrays. step() advances all the games at once with the
+    same rules as Zatacka, and games that are over are reset right away.
+    """
+
+    def __init__(self, nb_games, nb_players=2, width=200, height=200,
+                 speed=2, turn_speed=0.05, radius=2, spawn_distance=20, seed=None):
+        self.nb_games = nb_games
+        self.nb_players = nb_players
+        self.width = width
+        self.height = height
+        self.speed = speed
+        self.turn_speed = turn_speed
+        self.radius = radius
+        self.spawn_distance = spawn_distance
+        self.random = numpy.random.RandomState(seed)
+
+        # player ids must start at 1 because 0 on the grid means nothing
+        self.ids = numpy.arange(1, nb_players + 1, dtype=numpy.uint8)
+        # A game stops when only one snake is left, or none when playing solo
+        self.min_alive = 1 if nb_players > 1 else 0
+
+        self.grid = numpy.zeros((nb_games, width, height), dtype=numpy.uint8)
+        self.x = numpy.zeros((nb_games, nb_players))
+        self.y = numpy.zeros((nb_games, nb_players))
+        self.direction = numpy.zeros((nb_games, nb_players))
+        self.alive = numpy.zeros((nb_games, nb_players), dtype=bool)
+        self.scores = numpy.zeros((nb_games, nb_players), dtype=numpy.int64)
+        self.frame = numpy.zeros(nb_games, dtype=numpy.int64)
+        self.observation_buffer = numpy.zeros((nb_games, nb_players, width, height),
+                                              dtype=numpy.int8)
+
+        self._games = numpy.arange(nb_games)[:, None, None]
+        self.reset()
+
+    def reset(self, games=None):
+        """
+        Start new games, all of them or only the given game indices
+        """
+        if games is None:
+            games = numpy.arange(self.nb_games)
+        for game in games:
+            self.grid[game] = 0
+            self.x[game], self.y[game] = self.spawn_positions()
+            self.direction[game] = self.random.random_sample(self.nb_players) * 2 * numpy.pi
+            self.alive[game] = True
+            self.scores[game] = 0
+            self.frame[game] = 0
+        return self.observations()
+
+    def spawn_positions(self):
+        while True:
+            x = self.random.random_sample(self.nb_players) * self.width
+            y = self.random.random_sample(self.nb_players) * self.height
+            dist = (x[:, None] - x[None, :]) ** 2 + (y[:, None] - y[None, :]) ** 2
+            numpy.fill_diagonal(dist, numpy.inf)
+            if (dist >= self.spawn_distance ** 2).all():
+                return x, y
+
+    def step(self, actions):
+        """
+        actions : (games x players) indices into ACTIONS, ignored for dead snakes
+        Returns the observations, the rewards (games x players) and the done flags (games)
+        The observations of finished games are the ones of the game replacing them.
+        """
+        actions = numpy.asarray(actions)
+        movers = self.alive
+        turn = numpy.where(actions == 1, self.turn_speed, 0.) - numpy.where(actions == 2, self.turn_speed, 0.)
+        self.direction += numpy.where(movers, turn, 0.)
+
+        new_x, new_y = engine.move(self.x, self.y, self.direction,
+                                   self.speed, self.width, self.height)
+
+        sensor_xs, sensor_ys = engine.sensor_cells(new_x, new_y, self.direction, self.radius)
+        sensor_xs %= self.width
+        sensor_ys %= self.height
+        collided = self.grid[self._games, sensor_xs, sensor_ys].any(axis=-1)
+
+        trail_xs, trail_ys, valid = engine.trail_cells(self.x, self.y, self.radius, self.radius)
+        trail_xs %= self.width
+        trail_ys %= self.height
+        valid = valid & movers[..., None]
+        collided |= engine.earlier_stamp_hits(sensor_xs, sensor_ys, trail_xs, trail_ys, valid)
+        collided &= movers
+
+        # Flattened in game then player order, later players overwrite earlier ones
+        mask = valid[..., :, None] & valid[..., None, :]
+        cells = (numpy.broadcast_to(self._games[..., None], mask.shape)[mask],
+                 numpy.broadcast_to(trail_xs[..., :, None], mask.shape)[mask],
+                 numpy.broadcast_to(trail_ys[..., None, :], mask.shape)[mask])
+        self.grid[cells] = numpy.broadcast_to(self.ids[:, None, None], mask.shape)[mask]
+
+        self.x = numpy.where(movers, new_x, self.x)
+        self.y = numpy.where(movers, new_y, self.y)
+        self.alive = movers & ~collided
+        self.frame += 1
+
+        # Like in Zatacka, survivors score a point on each tick where someone died
+        rewards = (collided.any(axis=1)[:, None] & self.alive).astype(numpy.float32)
+        self.scores += rewards.astype(numpy.int64)
+        dones = self.alive.sum(axis=1) <= self.min_alive
+
+        if dones.any():
+            self.reset(numpy.flatnonzero(dones))
+        return self.observations(), rewards, dones
+
+    def observations(self):
+        """
+        Self centered view of every arena for every player :
+        1 for its own trail, -1 for the other trails and 0 for empty cells.
+        The returned array is reused by the next call.
+        """
+        grid = self.grid[:, None]
+        own = grid == self.ids[None, :, None, None]
+        other = (grid != 0) & ~own
+        numpy.subtract(own.view(numpy.int8), other.view(numpy.int8), out=self.observation_buffer)
+        return self.observation_buffer
@@ -1,21 +1,39 @@
 import copy
+import math
 import time
-import json
 import gevent
 import random
-from . import Player, BotPlayer, COLORS
+import numpy
+from collections import namedtuple
+from . import Player, RolloutBotPlayer, COLORS
+from . import engine
+from . import protocol
+from .arena_snapshot import ArenaSnapshot
+from .history import FrameHistory
+from .recording import MatchRecorder, recording_path
+from .latency import LatencyTracer
+from .observer import Observer, DROP_FRAMES, PLAYER, SPECTATOR, ROLES
+from .scheduler import TickScheduler, CAPPED
 
 
 class Grid(object):
-
-    def __init__(self, width, height, wrap=True):
+    """
+    Arena occupancy, 0 means empty and any other value is the id of the
+    snake whose trail covers the cell.
+    The cells live in one contiguous numpy array indexed as grid[x][y],
+    so bots can read it directly without copying it.
+    """
+
+    def __init__(self, width, height, wrap=True, dtype=numpy.uint8):
         self.width = width
         self.height = height
         self.wrap = wrap
-        self.grid = self.empty_grid(width, height)
+        self.grid = self.empty_grid(width, height, dtype)
+        # Old values of the cells written since the first checkpoint
+        self.journal = None
 
-    def empty_grid(self, w, h):
-        return [[0] * w for _ in range(h)]
+    def empty_grid(self, w, h, dtype=numpy.uint8):
+        return numpy.zeros((w, h), dtype=dtype)
 
     def get(self, x, y):
         if self.wrap:
@@ -24,7 +42,7 @@ class Grid(object):
             if not 0 <= y < self.height:
                 y = y % self.height
 
-        return self.grid[x][y]
+        return int(self.grid[x, y])
 
     def set(self, x, y, v):
         if self.wrap:
@@ -33,7 +51,192 @@ class Grid(object):
             if not 0 <= y < self.height:
                 y = y % self.height
 
-        self.grid[x][y] = v
+        if self.journal is not None:
+            self.journal.append((x, y, self.get(x, y)))
+        self.grid[x, y] = v
+
+    def get_many(self, xs, ys):
+        """
+        Read the cells at the integer coordinate arrays xs, ys at once
+        """
+        xs, ys = self.wrap_coordinates(xs, ys)
+        return self.grid[xs, ys]
+
+    def set_many(self, xs, ys, v):
+        """
+        Write v (a scalar or an array matching xs) at the coordinates xs, ys
+        """
+        xs, ys = self.wrap_coordinates(xs, ys)
+        if self.journal is not None:
+            self.journal.append((xs, ys, self.get_many(xs, ys)))
+        self.store(xs, ys, v)
+
+    def store(self, xs, ys, v):
+        """
+        Write already wrapped coordinates, without journaling
+        """
+        self.grid[xs, ys] = v
+
+    def checkpoint(self):
+        """
+        Start journaling the writes and return a marker for rollback()
+        Cost is proportional to the writes made after the first checkpoint,
+        not to the size of the arena.
+        """
+        if self.journal is None:
+            self.journal = []
+        return len(self.journal)
+
+    def rollback(self, marker):
+        """
+        Undo every write made since checkpoint() returned marker
+        The markers returned after this one are no longer valid.
+        """
+        while len(self.journal) > marker:
+            xs, ys, old = self.journal.pop()
+            self.store(numpy.asarray(xs), numpy.asarray(ys), old)
+
+    def release(self):
+        """
+        Stop journaling, every marker becomes invalid
+        """
+        self.journal = None
+
+    def copy(self):
+        grid = copy.copy(self)
+        grid.grid = self.grid.copy()
+        grid.journal = None
+        return grid
+
+    def wrap_coordinates(self, xs, ys):
+        xs = numpy.asarray(xs)
+        ys = numpy.asarray(ys)
+        if self.wrap:
+            xs = xs % self.width
+            ys = ys % self.height
+        return xs, ys
+
+    def is_region_empty(self, x0, y0, x1, y1):
+        """
+        Whether no cell with x0 <= x < x1 and y0 <= y < y1 is occupied
+        """
+        for xa, xb in region_spans(x0, x1, self.width, self.wrap):
+            for ya, yb in region_spans(y0, y1, self.height, self.wrap):
+                if self.grid[xa:xb, ya:yb].any():
+                    return False
+        return True
+
+
+class ChunkedGrid(Grid):
+    """
+    Sparse arena for very large maps, with the same interface as Grid.
+    The arena is cut in square tiles that are only allocated once a trail
+    enters them, so memory grows with the trails and not with the arena.
+    """
+
+    def __init__(self, width, height, wrap=True, dtype=numpy.uint8, tile_size=64):
+        self.width = width
+        self.height = height
+        self.wrap = wrap
+        self.dtype = dtype
+        self.tile_size = tile_size
+        self.tiles_y = -(-height // tile_size)
+        self.tiles = {}
+        self.journal = None
+
+    @property
+    def grid(self):
+        """
+        Dense copy of the arena, as big as the arena itself
+        """
+        grid = Grid.empty_grid(self, self.width, self.height, self.dtype)
+        for key, tile in self.tiles.items():
+            x, y = self.tile_origin(key)
+            grid[x:x + self.tile_size, y:y + self.tile_size] = \
+                tile[:self.width - x, :self.height - y]
+        return grid
+
+    def tile_origin(self, key):
+        return (key // self.tiles_y) * self.tile_size, (key % self.tiles_y) * self.tile_size
+
+    def get(self, x, y):
+        return int(self.get_many(x, y))
+
+    def set(self, x, y, v):
+        self.set_many(x, y, v)
+
+    def copy(self):
+        grid = copy.copy(self)
+        grid.tiles = {key: tile.copy() for key, tile in self.tiles.items()}
+        grid.journal = None
+        return grid
+
+    def get_many(self, xs, ys):
+        xs, ys = self.wrap_coordinates(xs, ys)
+        keys, local_xs, local_ys = self._split(xs, ys)
+        values = numpy.zeros(xs.shape, dtype=self.dtype)
+        for key in numpy.unique(keys):
+            tile = self.tiles.get(key)
+            if tile is not None:
+                selection = keys == key
+                values[selection] = tile[local_xs[selection], local_ys[selection]]
+        return values
+
+    def store(self, xs, ys, v):
+        keys, local_xs, local_ys = self._split(xs, ys)
+        values = numpy.broadcast_to(numpy.asarray(v, dtype=self.dtype), xs.shape)
+        for key in numpy.unique(keys):
+            selection = keys == key
+            tile = self.tiles.get(key)
+            if tile is None:
+                if not values[selection].any():
+                    continue
+                tile = self.tiles[key] = numpy.zeros((self.tile_size, self.tile_size),
+                                                     dtype=self.dtype)
+            tile[local_xs[selection], local_ys[selection]] = values[selection]
+
+    def _split(self, xs, ys):
+        keys = (xs // self.tile_size) * self.tiles_y + ys // self.tile_size
+        return keys, xs % self.tile_size, ys % self.tile_size
+
+    def is_region_empty(self, x0, y0, x1, y1):
+        for xa, xb in region_spans(x0, x1, self.width, self.wrap):
+            for ya, yb in region_spans(y0, y1, self.height, self.wrap):
+                if xa >= xb or ya >= yb:
+                    continue
+                # Only look up the tiles covering the span
+                for tile_x in range(xa // self.tile_size, (xb - 1) // self.tile_size + 1):
+                    for tile_y in range(ya // self.tile_size, (yb - 1) // self.tile_size + 1):
+                        tile = self.tiles.get(tile_x * self.tiles_y + tile_y)
+                        if tile is None:
+                            continue
+                        x, y = tile_x * self.tile_size, tile_y * self.tile_size
+                        if tile[max(xa - x, 0):xb - x, max(ya - y, 0):yb - y].any():
+                            return False
+        return True
+
+
+def region_spans(start, stop, size, wrap):
+    """
+    Cut [start, stop) into the slices of [0, size) it covers
+    """
+    start, stop = int(numpy.floor(start)), int(numpy.ceil(stop))
+    if not wrap:
+        return [(max(start, 0), min(stop, size))] if start < stop else []
+    if stop - start >= size:
+        return [(0, size)]
+    start, stop = start % size, start % size + (stop - start)
+    if stop <= size:
+        return [(start, stop)]
+    return [(start, size), (0, stop - size)]
+
+
+# Everything needed to put a running game back in a previous state
+GameSnapshot = namedtuple('GameSnapshot', ['grid', 'marker', 'frame', 'players', 'random_state'])
+
+# Kinematics of one snake and the state of its player
+PlayerSnapshot = namedtuple('PlayerSnapshot', ['player', 'x', 'y', 'old_x', 'old_y', 'direction',
+                                               'alive', 'score', 'command'])
 
 
 def too_close(x, y, xx, yy, min_dist):
@@ -44,80 +247,311 @@ def too_close(x, y, xx, yy, min_dist):
 
 class Zatacka(object):
 
-    def __init__(self, width=200, height=200):
+    # In headless mode, let the other greenlets run every that many frames
+    headless_yield_frames = 100
+
+    # One color per player
+    max_players = len(COLORS)
+
+    # Search time of the house bot on each tick, the rooms share it (see rooms.py)
+    house_bot_budget = 0.004
+
+    # Bigger arenas are stored in a ChunkedGrid
+    max_dense_cells = 4096 * 4096
+
+    # Outbound queue of each observer, and what to do when it is full (see observer.py)
+    observer_queue_size = 64
+    observer_policy = DROP_FRAMES
+
+    # Duration of a tick of the simulation, in seconds
+    frame_time = 0.0133
+
+    # What to do with late ticks, and how far behind the game may fall (see scheduler.py)
+    tick_policy = CAPPED
+    max_catch_up_ticks = 5
+
+    # Steps of the game kept in memory, the older ones are spilled to disk
+    history_frames = 1024
+
+    # Arena snapshot of the recordings every that many frames, for seeking
+    recording_keyframe_frames = 256
+
+    # Timestamp the commands of the players, see latency.py
+    trace_latency = False
+
+    # Network send rate of each client class in Hz, None sends every tick
+    # The ticks in between are bundled in the next message
+    send_rates = {PLAYER: 30, SPECTATOR: 20}
+
+    def __init__(self, width=200, height=200, headless=False, watch=False, seed=None,
+                 recording_dir=None):
+        """
+        headless : run as fast as possible, without building, sending or pacing frames
+        watch : when headless, go back to a normal paced game while someone observes it
+        seed : seed of the random generator used to spawn the snakes
+        recording_dir : directory where every game is recorded, see recording.py
+        """
+        self.seed = seed
+        self.random = random.Random(seed)
         self.clients = list()
         self.players = list()
-        self.game_history = []
+        self.game_history = FrameHistory(self.history_frames)
+        # Incremental copy of the arena for the observers joining a game in progress
+        self.arena_snapshot = ArenaSnapshot()
+        # Steps not sent yet to each client class
+        self.pending_steps = dict((role, []) for role in ROLES)
         self.width = width
         self.height = height
+        self.codecs = protocol.make_codecs(width, height)
+        self.headless = headless
+        self.watch = watch
+        self.greenlet = None
+        self.recording_dir = recording_dir
+        self.recorder = None
+        self.games_played = 0
+        self.scheduler = TickScheduler(self.frame_time, self.tick_policy, self.max_catch_up_ticks)
+
+    @property
+    def watched(self):
+        """
+        Whether frames are built for observers and paced on the wall clock
+        """
+        if not self.headless:
+            return True
+        return self.watch and len(self.clients) > 0
 
-    def register_observer(self, socket):
-        self.clients.append(socket)
-        self.send_size(socket)
-        self.broadcast_players()
-        for step in self.game_history:
-            self.send_frame(socket, step)
+    def register_observer(self, socket, protocol_name=protocol.JSON, role=SPECTATOR):
+        """
+        protocol_name : encoding of the messages sent to this observer, see protocol.py
+        role : client class of the observer, sets its frame rate (see send_rates)
+        """
+        if protocol_name not in self.codecs:
+            protocol_name = protocol.JSON
+        if role not in ROLES:
+            role = SPECTATOR
+        observer = Observer(socket, protocol_name,
+                            max_queue=self.observer_queue_size,
+                            policy=self.observer_policy,
+                            resync=self.arena_payload,
+                            on_close=self.remove_observer,
+                            role=role)
+        self.clients.append(observer)
+        self.send_size(observer)
+        self.send_scores(observer)
+        # One snapshot of the arena instead of every frame played so far,
+        # the live frames follow
+        self.send_payload(observer, self.arena_payload(observer))
+        return observer
+
+    def remove_observer(self, observer):
+        if observer in self.clients:
+            self.clients.remove(observer)
+        observer.close()
+
+    def arena_payload(self, observer):
+        grid = getattr(self, 'grid', None)
+        if grid is None:
+            return self.encode({'type': 'restart'}, observer.protocol)
+        self.arena_snapshot.update(grid)
+        return self.encode(self.arena_snapshot.message(self.frame), observer.protocol)
+
+    def observer_stats(self):
+        return [observer.stats() for observer in self.clients]
+
+    def tick_stats(self):
+        return self.scheduler.stats()
+
+    def latency_stats(self):
+        return dict((player.id, player.tracer.stats()) for player in self.players
+                    if player.tracer is not None)
 
     def broadcast_players(self):
-        for client in self.clients:
-            self.send_scores(client)
+        self.broadcast(self.scores_message())
+
+    def announce_new_game(self):
+        for steps in self.pending_steps.values():
+            del steps[:]
+        self.broadcast(self.size_message())
+        self.broadcast({'type': 'restart'})
+        self.broadcast_players()
 
     def send_frame(self, client, data):
         self.send(client, {'type': 'step', 'content': data})
 
     def send_scores(self, client):
+        self.send(client, self.scores_message())
+
+    def send_size(self, client):
+        self.send(client, self.size_message())
+
+    def scores_message(self):
         players = [{
             'id': player.id,
             'name': player.name,
             'score': player.score,
             'color': player.color,
                     } for player in self.players]
-        self.send(client, {'type': 'players', 'content': players})
+        return {'type': 'players', 'content': players}
 
-    def send_size(self, client):
-        self.send(client, {'type': 'size', 'width': self.width, 'height': self.height})
+    def size_message(self):
+        return {'type': 'size', 'width': self.width, 'height': self.height,
+                'scale': self.codecs[protocol.BINARY].scale}
 
     def register_player(self):
         if len(self.players) == 0:
             ids = [player.id for player in self.players]
             # player ids must start at 1 because 0 on the grid means nothing
-            free_ids = [i for i in range(1, 7) if i not in ids]
-            bot_player = BotPlayer(free_ids[0])
-            print('created bot %d' % player.id)
+            free_ids = [i for i in range(1, self.max_players + 1) if i not in ids]
+            bot_player = RolloutBotPlayer(free_ids[0], time_budget=self.house_bot_budget)
+            print('created bot %d' % bot_player.id)
             self.players.append(bot_player)
-        if len(self.players) < 6:
+        if len(self.players) < self.max_players:
             ids = [player.id for player in self.players]
             # player ids must start at 1 because 0 on the grid means nothing
-            free_ids = [i for i in range(1, 7) if i not in ids]
+            free_ids = [i for i in range(1, self.max_players + 1) if i not in ids]
             player = Player(free_ids[0])
+            if self.trace_latency:
+                player.tracer = LatencyTracer()
             print('created player %d' % player.id)
             self.players.append(player)
             return player
         else:
             return None
 
+    def set_house_bot_budget(self, budget):
+        self.house_bot_budget = budget
+        for player in self.players:
+            if isinstance(player, RolloutBotPlayer):
+                player.time_budget = budget
+
+    @property
+    def is_full(self):
+        return len(self.players) >= self.max_players
+
+    @property
+    def is_empty(self):
+        """
+        No human is playing or watching, the bots alone don't keep a game alive
+        """
+        return not self.clients and not any(player.is_human for player in self.players)
+
     def remove_player(self, player):
-        self.players.remove(player)
+        if player in self.players:
+            self.players.remove(player)
+            print('removed player %d' % player.id)
+        # A player leaving during a game is taken out of it at the next frame
+        player.alive = False
+        self.broadcast_players()
+
+    def encode(self, data, protocol_name=protocol.JSON):
+        return self.codecs[protocol_name].encode(data)
+
+    def send_interval(self, role):
+        """
+        Number of ticks between two frame messages to the observers of a class
+        From the paced tick time, a faster playback bundles more ticks per message
+        """
+        rate = self.send_rates.get(role)
+        if not rate:
+            return 1
+        return max(1, int(round(1. / (rate * self.scheduler.tick_time))))
+
+    def broadcast(self, data, role=None):
+        """
+        Encode the message once per protocol and send the same payload to every observer
+        role : only send to the observers of this class
+        """
+        # Frames can be skipped by slow observers, other messages can't
+        droppable = data['type'] in ('step', 'bundle')
+        payloads = dict()
+        for client in list(self.clients):
+            if role is not None and client.role != role:
+                continue
+            if client.protocol not in payloads:
+                payloads[client.protocol] = self.encode(data, client.protocol)
+            self.send_payload(client, payloads[client.protocol], droppable)
 
     def send(self, client, data):
-        try:
-            data = json.dumps(data)
-            client.send(data)
-        except Exception:
-            self.clients.remove(client)
+        self.send_payload(client, self.encode(data, client.protocol))
+
+    def send_payload(self, client, payload, droppable=False):
+        """
+        Only queue the payload, the observer greenlet does the network I/O
+        """
+        client.put(payload, droppable)
+
+    def new_grid(self):
+        if self.width * self.height > self.max_dense_cells:
+            return ChunkedGrid(self.width, self.height)
+        return Grid(self.width, self.height)
 
     def spawn_players(self):
         positions = []
         for player in self.players:
             need_spot = True
             while need_spot:
-                x = random.random() * self.width
-                y = random.random() * self.height
-                need_spot = False
+                x = self.random.random() * self.width
+                y = self.random.random() * self.height
+                need_spot = not self.grid.is_region_empty(x - 10, y - 10, x + 10, y + 10)
                 for (xx, yy) in positions:
                     if too_close(x, y, xx, yy, 20):
                         need_spot = True
-            player.spawn(x, y)
+            positions.append((x, y))
+            player.spawn(x, y, self.random.random() * 2 * math.pi)
+
+    def snapshot(self):
+        """
+        Cheap copy of the game state, the grid is only journaled so the cost
+        of a snapshot does not depend on the arena size.
+        Call release_snapshots() once no snapshot of this game is needed anymore.
+        """
+        players = []
+        for player in self.players:
+            snake = getattr(player, 'snake', None)
+            if snake is None:
+                continue
+            players.append(PlayerSnapshot(player, snake.x, snake.y, snake.old_x, snake.old_y,
+                                          snake.direction, player.alive, player.score,
+                                          player.command))
+        return GameSnapshot(self.grid, self.grid.checkpoint(), self.frame, players,
+                            self.random.getstate())
+
+    def restore(self, snapshot):
+        """
+        Go back to the state of the snapshot
+        The snapshots taken after this one can't be restored anymore.
+        """
+        if snapshot.grid is not self.grid:
+            raise ValueError('The snapshot was taken on another game')
+        self.grid.rollback(snapshot.marker)
+        self.frame = snapshot.frame
+        self.random.setstate(snapshot.random_state)
+        for state in snapshot.players:
+            player = state.player
+            snake = player.snake
+            snake.x, snake.y = state.x, state.y
+            snake.old_x, snake.old_y = state.old_x, state.old_y
+            snake.direction = state.direction
+            player.alive = state.alive
+            player.score = state.score
+            player.command = state.command
+
+    def release_snapshots(self):
+        self.grid.release()
+
+    def start_recording(self):
+        self.stop_recording()
+        if self.recording_dir is None:
+            return
+        path = recording_path(self.recording_dir, self.games_played, time.time())
+        self.recorder = MatchRecorder(path, self.width, self.height, self.players, self.seed,
+                                      self.recording_keyframe_frames)
+
+    def stop_recording(self):
+        if self.recorder is not None:
+            self.recorder.close()
+            print('recorded {}'.format(self.recorder.path))
+            self.recorder = None
 
     def run_action_step(self, alive_players):
         """
@@ -131,41 +565,134 @@ class Zatacka(object):
             if not player.is_human:
                 player.process(None, self.grid)
 
-        for player in alive_players:
-            player.update(self.grid)
+        # Move, collide and stamp every snake in one vectorized pass
+        movers = [player for player in alive_players if player.alive]
+        if not movers:
+            return
+        now = time.time()
+        for player in movers:
+            player.steer()
+            if player.tracer is not None:
+                player.tracer.applied(self.frame, now)
+        self.advance_snakes(movers)
+        for player in movers:
+            player.after_update(self.grid)
+
+    def advance_snakes(self, players):
+        snakes = [player.snake for player in players]
+        x = numpy.array([snake.x for snake in snakes])
+        y = numpy.array([snake.y for snake in snakes])
+        new_x, new_y, collided = engine.advance_snakes(
+            self.grid,
+            numpy.array([snake.id for snake in snakes]),
+            x, y,
+            numpy.array([snake.direction for snake in snakes]),
+            numpy.array([snake.speed for snake in snakes]),
+            numpy.array([snake.radius for snake in snakes]))
+
+        for i, (player, snake) in enumerate(zip(players, snakes)):
+            snake.old_x = snake.x
+            snake.old_y = snake.y
+            snake.x = float(new_x[i])
+            snake.y = float(new_y[i])
+            if collided[i]:
+                player.alive = False
 
     def run_display(self, alive_players):
         """
         Sharable step of the game
         Display only from the previous processing
         """
+        if self.recorder is not None:
+            self.recorder.record(self.frame, alive_players, self.grid)
+
+        if not self.watched:
+            for steps in self.pending_steps.values():
+                del steps[:]
+            self.remove_dead_players(alive_players)
+            # Pacing restarts from the current frame once someone watches
+            self.scheduler.reset()
+            if self.watch and self.frame % self.headless_yield_frames == 0:
+                gevent.sleep(0)
+            return
 
         data = list()
         for player in alive_players:
             data.append(player.get_snake())
+        died = [player.id for player in alive_players if not player.alive]
 
-        self.game_history.append(data)
+        step = {'type': 'step', 'frame': self.frame, 'content': data, 'died': died}
 
         # remove dead players only after broadcasting their last state
-        someone_died = False
-        for player in alive_players:
-            if not player.alive:
-                someone_died = True
-                alive_players.remove(player)
+        someone_died = self.remove_dead_players(alive_players)
 
+        # Deaths and the end of the game are not delayed
+        self.publish_step(step, flush=someone_died or not alive_players)
         if someone_died:
+            self.broadcast_players()
+        self.wait_next_frame()
+
+    def publish_step(self, step, flush=False):
+        """
+        Keep the step in the history and queue it for every client class
+        """
+        self.game_history.append(step)
+        for role, steps in self.pending_steps.items():
+            steps.append(step)
+            if len(steps) >= self.send_interval(role) or flush:
+                self.send_steps(role)
+
+    def wait_next_frame(self):
+        was_overloaded = self.scheduler.overloaded()
+        self.scheduler.wait(self.frame)
+        if self.scheduler.overloaded() != was_overloaded:
+            print('game {}overloaded at frame {}'.format('' if not was_overloaded else 'no longer ',
+                                                        self.frame))
+
+    def send_steps(self, role):
+        """
+        Send the pending steps to the observers of a class, in one bundle if there are several
+        """
+        steps = self.pending_steps[role]
+        if not steps:
+            return
+        if len(steps) == 1:
+            message = steps[0]
+        else:
+            message = {'type': 'bundle', 'frame': steps[-1]['frame'], 'steps': list(steps)}
+        del steps[:]
+        self.broadcast(message, role)
+        if role == PLAYER:
+            self.send_echoes(message['frame'])
+
+    def send_echoes(self, frame):
+        """
+        Tell the players which of their commands made it into the frames sent so far
+        """
+        now = time.time()
+        echo = dict()
+        for player in self.players:
+            if player.tracer is not None:
+                seq = player.tracer.broadcast(frame, now)
+                if seq is not None:
+                    echo[player.id] = seq
+        if echo:
+            self.broadcast({'type': 'echo', 'frame': frame, 'echo': echo}, PLAYER)
+
+    def remove_dead_players(self, alive_players):
+        """
+        Drop the dead players from alive_players and score the survivors
+        Returns whether someone died
+        """
+        dead_players = [player for player in alive_players if not player.alive]
+        for player in dead_players:
+            alive_players.remove(player)
+
+        if dead_players:
             print('someone died')
             for player in alive_players:
                 player.score += 1
-
-        for client in self.clients:
-            self.send_frame(client, data)
-            if someone_died:
-                self.send_scores(client)
-
-        next_frame_time = self.start_time + self.frame * self.frame_time
-        sleep_time = max(0, next_frame_time - time.time())
-        gevent.sleep(sleep_time)
+        return len(dead_players) > 0
 
     def run(self):
         """
@@ -175,29 +702,42 @@ class Zatacka(object):
 
         while True:
             print('creating new game')
-            self.grid = Grid(self.width, self.height)
-            self.game_history = []
-            self.start_time = time.time()
-            self.frame_time = 0.0133
+            self.grid = self.new_grid()
+            self.game_history.clear()
+            self.scheduler.reset()
             self.frame = -1
 
             # Communication with the front end
-            for client in self.clients:
-                self.send_size(client)
-            for client in self.clients:
-                self.send(client, {'type': 'restart'})
-            self.broadcast_players()
+            self.announce_new_game()
 
             # Create the players for the game
             self.spawn_players()
             alive_players = copy.copy(self.players)
+            if alive_players:
+                self.start_recording()
 
             # Main game loop
             while len(alive_players) > 0:
                 self.run_action_step(alive_players)
                 self.run_display(alive_players)
+            self.stop_recording()
+            self.games_played += 1
 
-            gevent.sleep(3)
+            if self.watched or not self.players:
+                # Nobody to play, wait for players instead of spinning
+                gevent.sleep(3)
+            else:
+                # Fast forward, only let the other greenlets run between games
+                gevent.sleep(0)
 
     def start(self):
-        gevent.spawn(self.run_server)
+        self.greenlet = gevent.spawn(self.run)
+        return self.greenlet
+
+    def stop(self):
+        if self.greenlet is not None:
+            self.greenlet.kill()
+            self.greenlet = None
+        self.stop_recording()
+        for observer in list(self.clients):
+            self.remove_observer(observer)
@@ -1,14 +1,16 @@
 import copy
-import time
 import gevent
-import random
 from . import BotPlayer, DeepQBotPlayer
-from .zatacka import Grid, Zatacka
+from .zatacka import Zatacka
 import cv2
 
 
 class ZatackaPlayground(Zatacka):
 
+    def __init__(self, width=200, height=200, headless=True, watch=True):
+        # Training runs as fast as possible unless someone is watching
+        super(ZatackaPlayground, self).__init__(width, height, headless=headless, watch=watch)
+
     def register_bots(self, nb_bots):
         # player ids must start at 1 because 0 on the grid means nothing
         ids = [player.id for player in self.players]
@@ -35,21 +37,17 @@ class ZatackaPlayground(Zatacka):
 
     def generate_context(self):
         print('creating new game')
-        self.grid = Grid(self.width, self.height)
-        self.game_history = []
-        self.start_time = time.time()
-        self.frame_time = 0.0133
+        self.grid = self.new_grid()
+        self.game_history.clear()
+        self.scheduler.reset()
         self.frame = -1
 
         # Communication with the front end
-        for client in self.clients:
-            self.send_size(client)
-        for client in self.clients:
-            self.send(client, {'type': 'restart'})
-        self.broadcast_players()
+        self.announce_new_game()
 
         # Create the players for the game
         self.spawn_bots()
+        self.start_recording()
         print("Game created and bot spawned !")
 
     def run_bot_training(self, context=None, nb_loops=10000):
@@ -72,6 +70,7 @@ class ZatackaPlayground(Zatacka):
             self.run_action_step(alive_players)
             self.run_display(alive_players)
             loop_iter += 1
+        self.stop_recording()
 
     def start(self):
         gevent.spawn(self.run_bot_training)
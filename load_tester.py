@@ -0,0 +1,223 @@
+"""
+Load test of a running zatacka_server
+
+Starts simulated players on /submit and spectators on /receive, then
+prints a JSON report : tick rate seen by the spectators, frame delivery
+delay percentiles, bytes received and server CPU.
+
+    python load_tester.py --players 5 --spectators 50 --duration 30 --server-pid 1234
+
+The delivery delay of a frame is measured on the spectator clock against
+the schedule of the frames : it is the time the frame arrived after the
+earliest it could have arrived given the best delivered frame of the game,
+so it needs no clock shared with the server.
+"""
+from gevent import monkey
+monkey.patch_all()
+
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import gevent
+import numpy
+import websocket
+from game_content import protocol
+
+COMMANDS = ('left', 'right', 'straight')
+
+
+class SimulatedPlayer(object):
+    """
+    Sends a random command a few times per second, like a human does
+    """
+
+    def __init__(self, url, number, command_rate, seed=None):
+        self.url = url
+        self.number = number
+        self.command_rate = command_rate
+        self.random = random.Random(seed)
+        self.sent_commands = 0
+        self.error = None
+
+    def run(self, deadline):
+        try:
+            connection = websocket.create_connection(self.url)
+            connection.send(json.dumps({'name': 'load-{}'.format(self.number)}))
+            while time.time() < deadline:
+                connection.send(json.dumps({'command': self.random.choice(COMMANDS)}))
+                self.sent_commands += 1
+                gevent.sleep(self.random.expovariate(self.command_rate))
+            connection.close()
+        except Exception as error:
+            self.error = repr(error)
+
+
+class SimulatedSpectator(object):
+    """
+    Receives the frames and notes when each one arrived
+    """
+
+    def __init__(self, url):
+        self.url = url
+        self.codec = protocol.BinaryCodec(1)
+        # One list of (arrival time, frame) per game seen
+        self.games = [[]]
+        self.received_bytes = 0
+        self.received_messages = 0
+        self.error = None
+
+    def run(self, deadline):
+        try:
+            connection = websocket.create_connection(self.url, timeout=1)
+            while time.time() < deadline:
+                try:
+                    payload = connection.recv()
+                except websocket.WebSocketTimeoutException:
+                    continue
+                self.on_message(payload, time.time())
+            connection.close()
+        except Exception as error:
+            self.error = repr(error)
+
+    def on_message(self, payload, arrival):
+        self.received_bytes += len(payload)
+        self.received_messages += 1
+        if isinstance(payload, bytes):
+            if payload[0] == protocol.STEP:
+                self.games[-1].append((arrival, self.codec.decode_step(payload)['frame']))
+            elif payload[0] == protocol.BUNDLE:
+                for step in self.codec.decode_bundle(payload)['steps']:
+                    self.games[-1].append((arrival, step['frame']))
+            return
+        message = json.loads(payload)
+        if message['type'] == 'step':
+            self.games[-1].append((arrival, message['frame']))
+        elif message['type'] == 'bundle':
+            for step in message['steps']:
+                self.games[-1].append((arrival, step['frame']))
+        elif message['type'] == 'size':
+            self.codec = protocol.BinaryCodec(message['scale'])
+        elif message['type'] == 'restart' and self.games[-1]:
+            self.games.append([])
+
+
+def percentiles(values, points=(50, 90, 99)):
+    if not len(values):
+        return {}
+    result = dict(('p{}'.format(point), float(numpy.percentile(values, point))) for point in points)
+    result['max'] = float(numpy.max(values))
+    return result
+
+
+def delivery_delays(frames, frame_time):
+    """
+    Delay of each frame after the earliest arrival allowed by the frame schedule
+    frames : (arrival time, frame number) of one game
+    """
+    arrivals = numpy.array([arrival for arrival, _ in frames])
+    numbers = numpy.array([frame for _, frame in frames])
+    offsets = arrivals - numbers * frame_time
+    return offsets - offsets.min()
+
+
+def tick_rates(frames, window=1.):
+    """
+    Frames per second seen in each window of one game
+    """
+    if len(frames) < 2:
+        return []
+    arrivals = numpy.array([arrival for arrival, _ in frames])
+    numbers = numpy.array([frame for _, frame in frames])
+    rates = []
+    start = 0
+    for end in range(1, len(frames)):
+        if arrivals[end] - arrivals[start] >= window:
+            rates.append((numbers[end] - numbers[start]) / (arrivals[end] - arrivals[start]))
+            start = end
+    return rates
+
+
+def process_cpu_time(pid):
+    """
+    User and system CPU seconds of a process, from /proc
+    """
+    with open('/proc/{}/stat'.format(pid)) as stat:
+        # The command name may hold spaces, the fields start after it
+        fields = stat.read().rsplit(')', 1)[1].split()
+    return (int(fields[11]) + int(fields[12])) / float(os.sysconf('SC_CLK_TCK'))
+
+
+def report(args, players, spectators, duration, cpu_seconds):
+    delays, rates, frames, gaps = [], [], 0, 0
+    for spectator in spectators:
+        for game in spectator.games:
+            if not game:
+                continue
+            delays.extend(delivery_delays(game, args.frame_time))
+            rates.extend(tick_rates(game))
+            numbers = sorted(set(frame for _, frame in game))
+            frames += len(numbers)
+            gaps += numbers[-1] - numbers[0] + 1 - len(numbers)
+
+    received_bytes = sum(spectator.received_bytes for spectator in spectators)
+    result = {
+        'config': vars(args),
+        'duration': duration,
+        'tick_rate': {
+            'expected': 1. / args.frame_time,
+            'mean': float(numpy.mean(rates)) if rates else 0.,
+            'std': float(numpy.std(rates)) if rates else 0.,
+            'min': float(numpy.min(rates)) if rates else 0.,
+        },
+        'frames': {'received': frames, 'missing': gaps},
+        'delivery_delay_ms': dict((key, 1000 * value) for key, value in percentiles(delays).items()),
+        'bytes_per_second': received_bytes / duration,
+        'messages_per_second': sum(s.received_messages for s in spectators) / duration,
+        'commands_sent': sum(player.sent_commands for player in players),
+        'errors': [client.error for client in players + spectators if client.error],
+    }
+    if cpu_seconds is not None:
+        result['server_cpu'] = {'seconds': cpu_seconds, 'percent': 100 * cpu_seconds / duration}
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().split('\n')[0])
+    parser.add_argument('--host', default='localhost:8000')
+    parser.add_argument('--room', default='load-test')
+    parser.add_argument('--players', type=int, default=5)
+    parser.add_argument('--spectators', type=int, default=20)
+    parser.add_argument('--duration', type=float, default=30., help='seconds')
+    parser.add_argument('--command-rate', type=float, default=4., help='commands per second and player')
+    parser.add_argument('--protocol', default=protocol.BINARY, choices=(protocol.JSON, protocol.BINARY))
+    parser.add_argument('--frame-time', type=float, default=0.0133, help='tick duration of the server')
+    parser.add_argument('--server-pid', type=int, help='measure the CPU of this process')
+    parser.add_argument('--output', help='write the report there instead of stdout')
+    args = parser.parse_args()
+
+    base = 'ws://{}'.format(args.host)
+    players = [SimulatedPlayer('{}/submit?room={}'.format(base, args.room), i, args.command_rate, seed=i)
+               for i in range(args.players)]
+    spectators = [SimulatedSpectator('{}/receive?room={}&protocol={}&role=spectator'.format(
+        base, args.room, args.protocol)) for _ in range(args.spectators)]
+
+    cpu_start = process_cpu_time(args.server_pid) if args.server_pid else None
+    start = time.time()
+    deadline = start + args.duration
+    gevent.joinall([gevent.spawn(client.run, deadline) for client in players + spectators])
+    duration = time.time() - start
+    cpu_seconds = process_cpu_time(args.server_pid) - cpu_start if args.server_pid else None
+
+    result = json.dumps(report(args, players, spectators, duration, cpu_seconds), indent=2)
+    if args.output:
+        with open(args.output, 'w') as output:
+            output.write(result)
+    else:
+        print(result)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -123,26 +123,166 @@ startAnimation();
 window.addEventListener('keyup', function(event){Keys.onKeyup(event);}, false);
 window.addEventListener('keydown', function(event){Keys.onKeydown(event);}, false);
 
-var inbox = new ReconnectingWebSocket("ws://"+ location.host + "/receive");
-var outbox = new ReconnectingWebSocket("ws://"+ location.host + "/submit");
+// Frames come as packed binary records unless the page asks for ?protocol=json
+var protocol = /[?&]protocol=json/.test(location.search) ? 'json' : 'binary';
+// The server always serves the page with the ?room= of the game to join
+var roomMatch = /[?&]room=([^&]*)/.exec(location.search);
+var room = roomMatch ? roomMatch[1] : 'default';
+// Spectators get fewer, bigger frame messages than players
+var role = /[?&]spectate/.test(location.search) ? 'spectator' : 'player';
+// Speed of the playback of a replay-<file> room
+var speedMatch = /[?&]speed=([^&]*)/.exec(location.search);
+var inbox = new ReconnectingWebSocket("ws://"+ location.host + "/receive?protocol=" + protocol +
+                                      "&room=" + room + "&role=" + role +
+                                      (speedMatch ? "&speed=" + speedMatch[1] : ""));
+var outbox = new ReconnectingWebSocket("ws://"+ location.host + "/submit?room=" + room);
+
+var frameScale = 1;
+
+// Commands are numbered so the server can trace their latency,
+// the echo of a command in a frame is acknowledged with its number
+var myId = null;
+var commandSeq = 0;
+var sendCommand = function(command) {
+    commandSeq++;
+    outbox.send(JSON.stringify({command: command, seq: commandSeq}));
+};
+var playerColors = {};
+
+// Layout of the binary messages, see game_content/protocol.py
+var STEP = 1;
+var ARENA = 2;
+var BUNDLE = 3;
+var STEP_HEADER_SIZE = 6;
+var SNAKE_RECORD_SIZE = 6;
+var BUNDLE_HEADER_SIZE = 6;
+var ARENA_HEADER_SIZE = 9;
+var ARENA_RUN_SIZE = 7;
+
+var decodeStep = function(buffer) {
+    var view = new DataView(buffer);
+    var count = view.getUint8(1);
+    var snakes = [];
+    for (var i=0; i<count; i++){
+        var offset = STEP_HEADER_SIZE + i * SNAKE_RECORD_SIZE;
+        var id = view.getUint8(offset);
+        snakes.push({
+            id: id,
+            x: view.getUint16(offset + 2, true) / frameScale,
+            y: view.getUint16(offset + 4, true) / frameScale,
+            color: playerColors[id]
+        });
+    }
+    return {type: 'step', frame: view.getUint32(2, true), content: snakes};
+};
+
+var decodeBundle = function(buffer) {
+    var view = new DataView(buffer);
+    var count = view.getUint8(1);
+    var steps = [];
+    var offset = BUNDLE_HEADER_SIZE;
+    for (var i=0; i<count; i++){
+        var size = STEP_HEADER_SIZE + view.getUint8(offset + 1) * SNAKE_RECORD_SIZE;
+        steps.push(decodeStep(buffer.slice(offset, offset + size)));
+        offset += size;
+    }
+    return {type: 'bundle', frame: view.getUint32(2, true), steps: steps};
+};
+
+var decodeArena = function(buffer) {
+    var view = new DataView(buffer);
+    var count = view.getUint32(5, true);
+    var runs = [];
+    for (var i=0; i<count; i++){
+        var offset = ARENA_HEADER_SIZE + i * ARENA_RUN_SIZE;
+        runs.push(view.getUint16(offset, true), view.getUint16(offset + 2, true),
+                  view.getUint16(offset + 4, true), view.getUint8(offset + 6));
+    }
+    return {type: 'arena', frame: view.getUint32(1, true), runs: runs};
+};
+
+var decodeBinary = function(buffer) {
+    var type = new DataView(buffer).getUint8(0);
+    if (type === STEP) {
+        return decodeStep(buffer);
+    }
+    if (type === BUNDLE) {
+        return decodeBundle(buffer);
+    }
+    if (type === ARENA) {
+        return decodeArena(buffer);
+    }
+    return {type: 'unknown'};
+};
+
+// Trails of a game joined in progress, as runs of x, y, length, owner
+var drawArena = function(runs) {
+    gctx.clearRect(0, 0, gCanvas.width, gCanvas.height);
+    for (var i=0; i<runs.length; i+=4){
+        gctx.fillStyle = playerColors[runs[i + 3]];
+        gctx.fillRect(runs[i], runs[i + 1], 1, runs[i + 2]);
+    }
+};
+
+inbox.onopen = function(event) {
+    event.target.binaryType = 'arraybuffer';
+};
 
 inbox.onmessage = function(message) {
     //console.log('received data: ' + message.data)
-    var data = JSON.parse(message.data);
+    if (message.data instanceof ArrayBuffer) {
+        handleMessage(decodeBinary(message.data));
+    } else if (typeof message.data !== 'string') {
+        // Blob received before binaryType was set
+        new Response(message.data).arrayBuffer().then(function(buffer) {
+            handleMessage(decodeBinary(buffer));
+        });
+    } else {
+        handleMessage(JSON.parse(message.data));
+    }
+};
+
+var handleMessage = function(data) {
+    if (data.type === 'redirect') {
+        // The room lives on another worker
+        location.href = data.url;
+    }
+    if (data.type === 'joined') {
+        myId = data.id;
+    }
+    if (data.type === 'echo' && myId !== null && data.echo[myId] !== undefined) {
+        outbox.send(JSON.stringify({ack: data.echo[myId]}));
+    }
+    if (data.type === 'full') {
+        // The room id comes from the query string, it is only inserted as text
+        $('#players').append($('<div>').text('Room ' + data.room + ' is full, watching only'));
+        outbox.close();
+    }
     if (data.type === 'step') {
         snakesQueue.push(data.content);
     }
+    if (data.type === 'bundle') {
+        // Every tick since the previous message, drawn one per game step
+        for (var i=0; i<data.steps.length; i++){
+            snakesQueue.push(data.steps[i].content);
+        }
+    }
     if (data.type === 'restart') {
         gctx.clearRect(0, 0, gCanvas.width, gCanvas.height);
     }
+    if (data.type === 'arena') {
+        drawArena(data.runs);
+    }
     if (data.type === 'size') {
         gCanvas.width = data.width;
         gCanvas.height = data.height;
+        frameScale = data.scale || 1;
     }
     if (data.type === 'players') {
         $('#players').html('');
         for (var i=0; i<data.content.length; i++){
             player = data.content[i];
+            playerColors[player.id] = player.color;
             $('#players').append('<div style="color:' + player.color + '">' +
                     player.id + ' - ' + player.name +
                     ': ' + player.score + '</div>')
@@ -150,6 +290,10 @@ inbox.onmessage = function(message) {
     }
 };
 
+outbox.onmessage = function(message) {
+    handleMessage(JSON.parse(message.data));
+};
+
 inbox.onclose = function(){
     console.log('inbox closed');
     this.inbox = new WebSocket(inbox.url);
@@ -193,10 +337,10 @@ var Keys = {
     onKeydown: function(event) {
         if(this._pressed[event.keyCode]) return;
         if(event.keyCode === this.LEFT[1]){
-            outbox.send(JSON.stringify({ command: "left"}));
+            sendCommand("left");
         }
         if(event.keyCode === this.RIGHT[1]){
-            outbox.send(JSON.stringify({ command: "right"}));
+            sendCommand("right");
         }
 
         this._pressed[event.keyCode] = true;
@@ -204,10 +348,10 @@ var Keys = {
 
     onKeyup: function(event) {
         if(event.keyCode === this.LEFT[1] && !this.isDown(this.RIGHT)){
-            outbox.send(JSON.stringify({ command: "straight"}));
+            sendCommand("straight");
         }
         if(event.keyCode === this.RIGHT[1] && !this.isDown(this.LEFT)){
-            outbox.send(JSON.stringify({ command: "straight"}));
+            sendCommand("straight");
         }
         delete this._pressed[event.keyCode];
     }
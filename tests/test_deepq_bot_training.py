@@ -1,8 +1,8 @@
 from unittest import TestCase
 import math
 import numpy as np
-from game_content.deepq_bot import AbstractDeepQGameAdapter
-from game_content.zatacka import Grid
+from game_content.deepq_bot import AbstractDeepQGameAdapter, DeepQBotPlayer
+from game_content.zatacka import Grid, Zatacka
 
 GRID_SIZE = 5
 
@@ -85,3 +85,67 @@ class TestDeepQTrainingOnDummyGame(TestCase):
         assert False
 
 
+
+
+class TestDeepQBotPlayer(TestCase):
+
+    def setUp(self):
+        self.bot = DeepQBotPlayer(1, buffer_size=8, time_frame_size=2,
+                                  game_size=(GRID_SIZE, GRID_SIZE))
+        self.bot.update_time = 15
+        self.bot.freeze_time = 15
+        self.trained_at = []
+        network_backward = self.bot.network_backward
+
+        def record(time_step):
+            self.trained_at.append(time_step)
+            network_backward(time_step)
+        self.bot.network_backward = record
+
+        self.grid = Grid(GRID_SIZE, GRID_SIZE)
+        self.grid.set(int(GRID_SIZE / 2), int(GRID_SIZE / 2), 1)
+        self.bot.spawn(int(GRID_SIZE / 2), int(GRID_SIZE / 2))
+
+    def test_time_step_and_training(self):
+        for step in range(31):
+            self.bot.process(None, self.grid)
+            self.assertEqual(self.bot.time_step, step + 1)
+            self.bot.after_update(self.grid)
+        self.assertEqual(self.trained_at, [15, 30])
+        self.assertEqual(len(self.bot.replay_adapter.replay), 8)
+
+    def test_death_and_new_game(self):
+        game = Zatacka(20, 20, seed=0)
+        bot = DeepQBotPlayer(1, buffer_size=2000, time_frame_size=2, game_size=(20, 20))
+        bot.update_time = bot.freeze_time = 10 ** 6
+        game.players = [bot]
+        game.frame = -1
+        replay = bot.replay_adapter.replay
+        episodes = []
+        for _ in range(2):
+            game.grid = game.new_grid()
+            game.spawn_players()
+            start = bot.time_step
+            while bot.alive:
+                game.run_action_step([bot])
+            died = bot.time_step - 1
+            # The engine killed the bot in its last step, stored as the end of the episode
+            self.assertEqual([replay.alive[t % replay.capacity] for t in range(start, died + 1)], [1] * (died - start) + [0])
+            self.assertEqual({replay.episode_of(t) for t in range(start, died + 1)}, {replay.episode_of(start)})
+            self.assertIn(died, replay.replayable(0, bot.time_step))
+            episodes.append(replay.episode_of(died))
+        self.assertNotEqual(episodes[0], episodes[1])
+
+        # A new game starts an episode even when the bot survived the last one
+        last = bot.time_step - 1
+        replay.store_alive(last, 1)
+        bot.spawn(10, 10)
+        bot.process(None, game.grid)
+        self.assertNotEqual(replay.episode_of(last + 1), replay.episode_of(last))
+
+    def test_default_buffer(self):
+        bot = DeepQBotPlayer(1, time_frame_size=2, game_size=(80, 80))
+        self.assertGreater(bot.buffer_size, 10000)
+        self.assertEqual(bot.learning_start, 1000)
+        with self.assertWarns(UserWarning):
+            DeepQBotPlayer(1, buffer_size=2, time_frame_size=4, game_size=(GRID_SIZE, GRID_SIZE))
@@ -0,0 +1,191 @@
+from unittest import TestCase, mock
+import numpy as np
+from game_content.double_q_network import GridReplayAdapter, game_adapter
+from game_content.double_q_network.game_adapter import encode_observation, pack_observation, \
+    unpack_observations, packed_size
+from game_content.double_q_network.replay_buffer import ReplayBuffer
+from game_content.zatacka import Grid
+
+
+class FakePlayer(object):
+
+    def __init__(self, id_):
+        self.id = id_
+
+
+class TestObservationEncoder(TestCase):
+
+    def test_self_centered_view(self):
+        grid = Grid(4, 3)
+        grid.set(0, 0, 2)
+        grid.set(1, 2, 3)
+        grid.set(3, 1, 2)
+        view = encode_observation(grid.grid, 2)
+        expected = np.zeros((4, 3), dtype=np.float32)
+        expected[0, 0] = expected[3, 1] = 1
+        expected[1, 2] = -1
+        np.testing.assert_array_equal(view, expected)
+        # Lists of lists are still accepted
+        np.testing.assert_array_equal(encode_observation(grid.grid.tolist(), 2), expected)
+
+    def test_preallocated_output(self):
+        cells = np.random.RandomState(0).randint(0, 7, (20, 30)).astype(np.uint8)
+        out = np.empty((20, 30), dtype=np.int8)
+        self.assertIs(encode_observation(cells, 5, out=out), out)
+        np.testing.assert_array_equal(out, np.where(cells == 0, 0, np.where(cells == 5, 1, -1)))
+
+    def test_adapter_transform(self):
+        adapter = GridReplayAdapter(10, 2, (20, 30), 4)
+        cells = np.random.RandomState(1).randint(0, 7, (20, 30)).astype(np.uint8)
+        view = adapter._transform_grid_to_nd_mat(cells, FakePlayer(3)).asnumpy()
+        np.testing.assert_array_equal(view, encode_observation(cells, 3))
+
+
+class TestPackedObservations(TestCase):
+
+    def check_round_trip(self, shape):
+        cells = np.random.RandomState(2).randint(0, 7, shape).astype(np.uint8)
+        packed = pack_observation(cells, 4, np.empty(packed_size(shape), dtype=np.uint8))
+        # 2 bits per cell
+        self.assertEqual(len(packed), -(-cells.size // 4))
+        np.testing.assert_array_equal(unpack_observations(packed, np.empty(shape, dtype=np.float32)),
+                                      encode_observation(cells, 4))
+
+    def test_round_trip(self):
+        self.check_round_trip((8, 12))
+        # The last byte is not full
+        self.check_round_trip((5, 5))
+
+    def test_unpack_stacks(self):
+        cells = np.random.RandomState(3).randint(0, 7, (3, 2, 5, 5)).astype(np.uint8)
+        packed = np.empty((3, 2, packed_size((5, 5))), dtype=np.uint8)
+        for index in np.ndindex(3, 2):
+            pack_observation(cells[index], 1, packed[index])
+        np.testing.assert_array_equal(unpack_observations(packed, np.empty((3, 2, 5, 5), dtype=np.float32)),
+                                      encode_observation(cells, 1))
+
+
+class TestReplayBuffer(TestCase):
+
+    def test_ring(self):
+        buffer = ReplayBuffer(4, (2, 3))
+        for t in range(6):
+            buffer.store_observation(t, np.full((2, 3), t))
+            buffer.store_action(t, t % 3)
+            buffer.store_reward(t - 1, t * 10)
+        self.assertEqual(len(buffer), 4)
+        self.assertFalse(buffer.holds(1))
+        self.assertTrue(buffer.holds(2))
+        np.testing.assert_array_equal(buffer.observation(5), np.full((2, 3), 5))
+        self.assertEqual(buffer.actions[5 % 4], 2)
+        self.assertEqual(buffer.rewards[4 % 4], 50)
+        # The reward of an evicted step is dropped
+        buffer.store_reward(0, 1.)
+        self.assertEqual(buffer.rewards[0], 50)
+
+    def test_adapter_memory_is_flat(self):
+        adapter = GridReplayAdapter(16, 3, (8, 8), 4)
+        player = FakePlayer(1)
+        cells = np.zeros((8, 8), dtype=np.uint8)
+        nbytes = adapter.replay.observations.nbytes
+        for t in range(200):
+            cells[t % 8, t // 8 % 8] = 1 + t % 2
+            adapter.store_reward_in_history(float(t), t - 1)
+            adapter.store_death_in_history(1, t - 1)
+            adapter.store_grid_in_history(cells, t, player)
+            adapter.build_phi_t(t)
+            adapter.store_action_in_history(t % 4, t)
+        self.assertEqual(len(adapter.replay), 16)
+        self.assertEqual(adapter.replay.observations.nbytes, nbytes)
+
+        batch = adapter.build_phi_replay(10, 199)
+        self.assertEqual(batch['st'].shape, (10, 3, 8, 8))
+        rewards = batch['rt'].asnumpy()
+        actions = batch['at'].asnumpy()
+        # The reward of the step t is stored at t + 1, and t + 1 must still have its phi
+        self.assertTrue(((rewards > 184) & (rewards <= 199)).all())
+        np.testing.assert_array_equal(actions, (rewards - 1) % 4)
+
+        # The observations are expanded back to the self centered view
+        phi = adapter.build_phi_t(199).asnumpy()
+        self.assertEqual(phi.shape, (3, 8, 8))
+        np.testing.assert_array_equal(phi[0], encode_observation(cells, 1))
+        adapter.close_prefetch()
+
+    def test_prefetched_batches(self):
+        adapters = [GridReplayAdapter(32, 3, (8, 8), 4) for _ in range(2)]
+        adapters[1].prefetch = False
+        cells = np.zeros((8, 8), dtype=np.uint8)
+        for t in range(40):
+            cells[t % 8, t // 8 % 8] = 1 + t % 2
+            for adapter in adapters:
+                adapter.store_reward_in_history(float(t), t - 1)
+                adapter.store_grid_in_history(cells, t, FakePlayer(1))
+                adapter.store_action_in_history(t % 4, t)
+
+        batches = []
+        for adapter in adapters:
+            np.random.seed(0)
+            batches.append([dict((key, value.asnumpy()) for key, value in adapter.build_phi_replay(6, 39).items())
+                            for _ in range(3)])
+            adapter.close_prefetch()
+        for prefetched, assembled in zip(*batches):
+            for key in assembled:
+                np.testing.assert_array_equal(prefetched[key], assembled[key])
+        self.assertIsNone(adapters[0].prefetcher)
+
+    def test_unpack_outside_the_lock(self):
+        adapter = GridReplayAdapter(32, 3, (8, 8), 4)
+        adapter.prefetch = False
+        cells = np.zeros((8, 8), dtype=np.uint8)
+        for t in range(40):
+            cells[t % 8, t // 8 % 8] = 1 + t % 2
+            adapter.store_grid_in_history(cells, t, FakePlayer(1))
+        locked = []
+
+        def unpack(packed, out):
+            locked.append(adapter.replay.lock.locked())
+            return unpack_observations(packed, out)
+        with mock.patch.object(game_adapter, 'unpack_observations', unpack):
+            staging = adapter.assemble_replay(adapter.make_staging(6), 6, 39)
+        self.assertEqual(locked, [False, False])
+        # st and stpo come from their own packed stacks
+        np.testing.assert_array_equal(staging['st'][:, :2], staging['stpo'][:, 1:])
+
+    def test_capacity_in_bytes(self):
+        adapter = GridReplayAdapter(16, 3, (8, 8), 4, buffer_bytes=100000)
+        self.assertEqual(adapter.buffer_size, 100000 // ReplayBuffer.transition_bytes((16,), np.uint8))
+
+
+class TestFrameStacks(TestCase):
+
+    def setUp(self):
+        self.buffer = ReplayBuffer(8, (2, 2))
+        # Two episodes : 0 to 4 where the player dies, then 5 to 9
+        for t in range(10):
+            self.buffer.store_alive(t - 1, 0 if t == 5 else 1)
+            self.buffer.store_observation(t, np.full((2, 2), t + 1))
+
+    def stack(self, t, episode=None):
+        out = np.empty((3, 2, 2), dtype=np.float32)
+        self.buffer.frame_stack(t, 3, out, episode=episode)
+        return out[:, 0, 0].tolist()
+
+    def test_stacks(self):
+        self.assertEqual(self.stack(9), [10, 9, 8])
+        self.assertEqual(self.stack(4), [5, 4, 3])
+
+    def test_episode_boundary(self):
+        self.assertEqual(self.stack(6), [7, 6, 0])
+        self.assertEqual(self.stack(5), [6, 0, 0])
+        # The step after the death, seen from the first episode
+        self.assertEqual(self.stack(5, episode=self.buffer.episode_of(4)), [0, 5, 4])
+
+    def test_evicted_frames(self):
+        # The slots of 0 and 1 hold 8 and 9 now
+        self.assertEqual(self.stack(2), [3, 0, 0])
+
+    def test_new_episode_on_gap(self):
+        self.buffer.store_observation(20, np.full((2, 2), 21))
+        self.assertEqual(self.stack(20), [21, 0, 0])
+        self.assertNotEqual(self.buffer.episode_of(20), self.buffer.episode_of(9))
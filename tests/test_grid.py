@@ -0,0 +1,87 @@
+from unittest import TestCase
+import numpy as np
+from game_content.zatacka import Grid, ChunkedGrid
+from game_content.arena_snapshot import ArenaSnapshot, paint_runs
+
+
+class TestGrid(TestCase):
+
+    def test_wrap_around(self):
+        grid = Grid(10, 8)
+        grid.set(-1, 8, 3)
+        self.assertEqual(grid.get(9, 0), 3)
+        self.assertEqual(grid.get(19, -8), 3)
+
+    def test_bulk_access_matches_single_cells(self):
+        grid = Grid(10, 8)
+        xs = np.array([-1, 0, 10, 25])
+        ys = np.array([0, -3, 7, 9])
+        grid.set_many(xs, ys, np.array([1, 2, 3, 4]))
+
+        self.assertEqual(list(grid.get_many(xs, ys)), [1, 2, 3, 4])
+        self.assertEqual([grid.get(x, y) for x, y in zip(xs, ys)], [1, 2, 3, 4])
+        self.assertEqual(int(np.count_nonzero(grid.grid)), 4)
+
+
+class TestChunkedGrid(TestCase):
+
+    def setUp(self):
+        self.rng = np.random.RandomState(0)
+        self.dense = Grid(100, 70)
+        self.sparse = ChunkedGrid(100, 70, tile_size=16)
+
+    def test_matches_dense_grid(self):
+        for _ in range(20):
+            xs = self.rng.randint(-150, 150, 30)
+            ys = self.rng.randint(-150, 150, 30)
+            values = self.rng.randint(0, 4, 30)
+            self.dense.set_many(xs, ys, values)
+            self.sparse.set_many(xs, ys, values)
+
+        np.testing.assert_array_equal(self.sparse.grid, self.dense.grid)
+        xs = self.rng.randint(-150, 150, 200)
+        ys = self.rng.randint(-150, 150, 200)
+        np.testing.assert_array_equal(self.sparse.get_many(xs, ys), self.dense.get_many(xs, ys))
+        self.assertEqual(self.sparse.get(-1, 3), self.dense.get(-1, 3))
+
+    def test_tiles_allocated_on_demand(self):
+        self.sparse.set_many([1, 2, 3], [1, 2, 3], 0)
+        self.assertEqual(len(self.sparse.tiles), 0)
+        self.sparse.set(50, 50, 2)
+        self.sparse.set(99, 69, 2)
+        self.assertEqual(len(self.sparse.tiles), 2)
+
+    def test_region_empty(self):
+        for grid in (self.dense, self.sparse):
+            grid.set(99, 0, 1)
+            self.assertFalse(grid.is_region_empty(95, -5, 100, 5))
+            self.assertFalse(grid.is_region_empty(-3, -3, 3, 3))
+            self.assertTrue(grid.is_region_empty(0, 0, 99, 69))
+            self.assertTrue(grid.is_region_empty(10, 10, 40, 40))
+
+    def test_region_empty_matches_dense_grid(self):
+        xs = self.rng.randint(0, 100, 15)
+        ys = self.rng.randint(0, 70, 15)
+        self.dense.set_many(xs, ys, 1)
+        self.sparse.set_many(xs, ys, 1)
+        for _ in range(200):
+            x0, y0 = self.rng.uniform(-120, 120, 2)
+            x1, y1 = x0 + self.rng.uniform(0, 60), y0 + self.rng.uniform(0, 60)
+            self.assertEqual(self.sparse.is_region_empty(x0, y0, x1, y1),
+                             self.dense.is_region_empty(x0, y0, x1, y1))
+
+
+class TestArenaSnapshot(TestCase):
+
+    def test_incremental_updates(self):
+        rng = np.random.RandomState(1)
+        for grid in (Grid(50, 40), ChunkedGrid(50, 40, tile_size=16)):
+            snapshot = ArenaSnapshot()
+            for _ in range(5):
+                xs = rng.randint(0, 50, 40)
+                ys = rng.randint(0, 40, 40)
+                grid.set_many(xs, ys, rng.randint(0, 4, 40))
+                grid.set_many(xs[:5], np.arange(5), 2)
+                runs = snapshot.update(grid).runs()
+                np.testing.assert_array_equal(paint_runs(runs, 50, 40), grid.grid)
+            self.assertIs(snapshot.update(grid).runs(), runs)
@@ -0,0 +1,64 @@
+from unittest import TestCase
+import os
+import tempfile
+from game_content.history import FrameHistory
+
+
+def make_step(frame):
+    return {'type': 'step', 'frame': frame, 'died': [2] if frame % 10 == 0 else [],
+            'content': [{'id': 1, 'x': frame * 0.5, 'y': 3.25, 'color': '#f00'},
+                        {'id': 2, 'x': 7., 'y': frame * 0.25, 'color': '#0f0'}]}
+
+
+class TestFrameHistory(TestCase):
+
+    def test_in_memory(self):
+        history = FrameHistory(capacity=10)
+        for frame in range(5):
+            history.append(make_step(frame))
+        self.assertEqual(len(history), 5)
+        self.assertIsNone(history.log)
+        self.assertEqual(list(history), [make_step(frame) for frame in range(5)])
+        self.assertEqual(history[-1]['frame'], 4)
+
+    def test_spill(self):
+        history = FrameHistory(capacity=10)
+        for frame in range(100):
+            history.append(make_step(frame))
+        self.assertEqual(len(history.recent), 10)
+        self.assertEqual(len(history), 100)
+        self.assertEqual(list(history), [make_step(frame) for frame in range(100)])
+        self.assertEqual(history[-1]['frame'], 99)
+        self.assertEqual(history[90]['frame'], 90)
+        self.assertRaises(IndexError, history.__getitem__, 89)
+
+    def test_append_while_iterating(self):
+        history = FrameHistory(capacity=2)
+        for frame in range(5):
+            history.append(make_step(frame))
+        steps = iter(history)
+        self.assertEqual(next(steps)['frame'], 0)
+        history.append(make_step(5))
+        self.assertEqual([step['frame'] for step in history], list(range(6)))
+
+    def test_spill_while_iterating(self):
+        history = FrameHistory(capacity=2)
+        for frame in range(5):
+            history.append(make_step(frame))
+        steps = iter(history)
+        self.assertEqual(next(steps)['frame'], 0)
+        # Spills the steps 3 and 4 behind the iterator
+        history.append(make_step(5))
+        history.append(make_step(6))
+        self.assertEqual([step['frame'] for step in steps], list(range(1, 7)))
+
+    def test_clear(self):
+        path = os.path.join(tempfile.mkdtemp(), 'history.log')
+        history = FrameHistory(capacity=2, spill_path=path)
+        for frame in range(5):
+            history.append(make_step(frame))
+        history.log.flush()
+        self.assertEqual(os.path.getsize(path), 3 * (5 + 2 * 10))
+        history.clear()
+        self.assertEqual(len(history), 0)
+        self.assertEqual(list(history), [])
@@ -0,0 +1,76 @@
+from unittest import TestCase
+import copy
+import json
+import gevent
+from game_content import Zatacka, protocol, observer
+from game_content.latency import LatencyTracer
+
+
+class FakeSocket(object):
+
+    def __init__(self):
+        self.sent = []
+
+    def send(self, data):
+        self.sent.append(data)
+
+
+class TestLatencyTracer(TestCase):
+
+    def test_command_path(self):
+        tracer = LatencyTracer()
+        tracer.received(1, 10.)
+        tracer.received(2, 10.001)
+        tracer.applied(5, 10.01)
+        self.assertIsNone(tracer.broadcast(4, 10.02))
+        self.assertEqual(tracer.broadcast(5, 10.03), 2)
+        tracer.received(3, 10.04)
+        tracer.ack(2, 10.08)
+
+        stats = tracer.stats()
+        self.assertEqual(stats['acked'], 2)
+        self.assertEqual(stats['pending'], 1)
+        self.assertEqual(stats['total']['<=0.1'], 2)
+        self.assertEqual(stats['received_to_applied']['<=0.01'], 2)
+        self.assertAlmostEqual(stats['max_total'], 0.08)
+
+    def test_bounded(self):
+        tracer = LatencyTracer(max_pending=4)
+        for seq in range(10):
+            tracer.received(seq, 0.)
+        self.assertEqual(len(tracer.pending), 4)
+        self.assertEqual(tracer.stats()['lost'], 6)
+        tracer.ack(42, 1.)
+        self.assertEqual(tracer.stats()['acked'], 0)
+
+
+class TestTracedGame(TestCase):
+
+    def test_echo_and_ack(self):
+        game = Zatacka(60, 60, seed=0)
+        game.trace_latency = True
+        game.send_rates = {}
+        player = game.register_player()
+        socket = FakeSocket()
+        game.register_observer(socket, protocol.JSON, observer.PLAYER)
+        spectator = FakeSocket()
+        game.register_observer(spectator, protocol.JSON, observer.SPECTATOR)
+
+        game.grid = game.new_grid()
+        game.frame = -1
+        game.spawn_players()
+        alive_players = copy.copy(game.players)
+        player.process(json.dumps({'command': 'left', 'seq': 7}), None)
+        for _ in range(3):
+            game.run_action_step(alive_players)
+            game.run_display(alive_players)
+        gevent.sleep(0)
+
+        echoes = [m for m in map(json.loads, socket.sent) if m['type'] == 'echo']
+        self.assertEqual(echoes, [{'type': 'echo', 'frame': 0, 'echo': {str(player.id): 7}}])
+        self.assertFalse([m for m in map(json.loads, spectator.sent) if m['type'] == 'echo'])
+
+        player.process(json.dumps({'ack': 7}), None)
+        stats = game.latency_stats()
+        self.assertEqual(list(stats), [player.id])
+        self.assertEqual(stats[player.id]['acked'], 1)
@@ -0,0 +1,120 @@
+from unittest import TestCase
+import copy
+import json
+import shutil
+import tempfile
+import gevent
+import numpy as np
+from game_content import Player, Zatacka, observer
+from game_content.recording import MatchReader, FOOTER
+from game_content.playback import PlaybackZatacka
+from game_content.zatacka import Grid, ChunkedGrid
+from game_content.arena_snapshot import paint_runs
+
+
+class FakeSocket(object):
+
+    def __init__(self):
+        self.sent = []
+
+    def send(self, data):
+        self.sent.append(data)
+
+
+class TestRecording(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.game = Zatacka(60, 60, seed=0, recording_dir=self.directory)
+        self.game.register_observer(FakeSocket())
+        self.game.send_rates = {}
+        self.game.frame_time = 0
+        self.game.recording_keyframe_frames = 8
+        self.game.players = [Player(1), Player(2), Player(3)]
+        for player, command in zip(self.game.players, ['left', 'right', None]):
+            player.command = command
+        # 17 bytes in utf-8, the last character does not fit the record
+        self.game.players[0].name = 'a' + '\u00e9' * 8
+        self.game.grid = self.game.new_grid()
+        self.game.frame = -1
+        self.game.spawn_players()
+        self.game.start_recording()
+        self.path = self.game.recorder.path
+        alive_players = copy.copy(self.game.players)
+        while alive_players and self.game.frame < 600:
+            self.game.run_action_step(alive_players)
+            self.game.run_display(alive_players)
+        self.game.stop_recording()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def check_recording(self, recording):
+        self.assertEqual((recording.width, recording.height, recording.seed), (60, 60, 0))
+        self.assertEqual([player['id'] for player in recording.players], [1, 2, 3])
+        self.assertEqual(recording.players[0]['name'], 'a' + '\u00e9' * 7)
+        self.assertEqual(len(recording), self.game.frame + 1)
+        self.assertEqual([recording.step(i) for i in range(len(recording))], list(self.game.game_history))
+
+        grid = Grid(60, 60)
+        recording.arena_at(grid, len(recording) - 1)
+        np.testing.assert_array_equal(grid.grid, self.game.grid.grid)
+        chunked = ChunkedGrid(60, 60, tile_size=16)
+        recording.arena_at(chunked, len(recording) - 1)
+        np.testing.assert_array_equal(chunked.grid, self.game.grid.grid)
+
+    def test_read(self):
+        recording = MatchReader(self.path)
+        self.assertGreater(len(recording.keyframe_offsets), 1)
+        self.check_recording(recording)
+        recording.close()
+
+    def test_read_without_index(self):
+        with open(self.path, 'rb') as original:
+            data = original.read()
+        index_offset = FOOTER.unpack_from(data, len(data) - FOOTER.size)[0]
+        with open(self.path, 'wb') as truncated:
+            truncated.write(data[:index_offset])
+        recording = MatchReader(self.path)
+        self.check_recording(recording)
+        recording.close()
+
+    def test_playback(self):
+        playback = PlaybackZatacka(self.path, loop=False)
+        playback.max_speed = 1000.
+        playback.set_speed(1000.)
+        playback.send_rates = {}
+        socket = FakeSocket()
+        playback.register_observer(socket)
+        playback.run()
+        gevent.sleep(0)
+        steps = [message for message in map(json.loads, socket.sent) if message['type'] == 'step']
+        self.assertEqual(steps, list(self.game.game_history))
+        np.testing.assert_array_equal(playback.grid.grid, self.game.grid.grid)
+
+        # A late observer sees the arena of the tick played
+        playback.seek(20)
+        late = FakeSocket()
+        playback.register_observer(late)
+        gevent.sleep(0)
+        arena = json.loads(late.sent[2])
+        self.assertEqual(arena['frame'], 20)
+        grid = Grid(60, 60)
+        playback.recording.arena_at(grid, 20)
+        np.testing.assert_array_equal(paint_runs(arena['runs'], 60, 60), grid.grid)
+        playback.stop()
+
+    def test_playback_speed(self):
+        playback = PlaybackZatacka(self.path, loop=False)
+        for speed, clamped in [(2., 2.), ('4', 4.), (0, 0.1), (-3., 0.1), (1e9, 16.),
+                               ('abc', 1.), ('nan', 1.), (None, 1.)]:
+            playback.set_speed(speed)
+            self.assertEqual(playback.speed, clamped)
+            self.assertEqual(playback.scheduler.tick_time, playback.frame_time / clamped)
+
+        # The observers keep their frame rate, with more ticks in each message
+        playback.set_speed(1.)
+        normal = playback.send_interval(observer.SPECTATOR)
+        playback.set_speed(4.)
+        self.assertAlmostEqual(playback.send_interval(observer.SPECTATOR), 4 * normal, delta=1)
+        playback.stop()
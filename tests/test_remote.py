@@ -0,0 +1,108 @@
+from unittest import TestCase
+import json
+import gevent
+from gevent.event import AsyncResult
+from gevent.socket import wait_read
+from multiprocessing import Pipe, shared_memory
+from game_content import protocol, observer
+from game_content.remote import RemoteZatacka, SimulatedZatacka
+
+
+class FakeSocket(object):
+
+    def __init__(self):
+        self.sent = []
+
+    def send(self, data):
+        self.sent.append(data)
+
+
+class TestRemoteZatacka(TestCase):
+
+    def setUp(self):
+        self.game = RemoteZatacka(60, 60, seed=0)
+        self.game.start()
+
+    def tearDown(self):
+        self.game.stop()
+
+    def wait_for(self, condition, timeout=20):
+        with gevent.Timeout(timeout):
+            while not condition():
+                gevent.sleep(0.05)
+
+    def test_frames_come_from_the_process(self):
+        socket = FakeSocket()
+        self.game.register_observer(socket, protocol.JSON, observer.PLAYER)
+        player = self.game.register_player()
+        self.assertEqual(player.id, 2)
+        self.assertFalse(self.game.is_full)
+        player.process(json.dumps({'command': 'left', 'name': 'remote'}), None)
+
+        self.wait_for(lambda: self.game.frame > 20)
+        messages = [json.loads(payload) for payload in socket.sent]
+        names = [p['name'] for m in messages if m['type'] == 'players' for p in m['content']]
+        self.assertIn('remote', names)
+        self.assertTrue(any(m['type'] in ('step', 'bundle') for m in messages))
+        # The trails are read from the shared memory
+        self.assertTrue(self.game.grid.grid.any())
+
+    def test_leave_and_stop(self):
+        player = self.game.register_player()
+        self.game.remove_player(player)
+        self.assertTrue(self.game.is_empty)
+        process = self.game.process
+        self.game.stop()
+        self.assertFalse(process.is_alive())
+        self.assertIsNone(self.game.register_player())
+
+    def test_child_exit(self):
+        self.game.register_player()
+        reply = AsyncResult()
+        self.game.pending_joins.append(reply)
+        self.game.process.terminate()
+        # The join waiting for the dead child gets None, and so do the next ones
+        self.assertIsNone(reply.get(timeout=10))
+        self.assertIsNone(self.game.process)
+        with gevent.Timeout(1):
+            self.assertIsNone(self.game.register_player())
+
+
+class TestSimulatedZatacka(TestCase):
+
+    def setUp(self):
+        self.memory = shared_memory.SharedMemory(create=True, size=30 * 30)
+        self.connection, child_connection = Pipe()
+        self.game = SimulatedZatacka(child_connection, self.memory.name, 30, 30)
+        self.sender = gevent.spawn(self.game.send_outbox)
+
+    def tearDown(self):
+        self.sender.kill()
+        self.game.socket.close()
+        self.game.connection.close()
+        self.connection.close()
+        self.game.grid = self.game.shared_grid = None
+        self.game.memory.close()
+        self.memory.close()
+        self.memory.unlink()
+
+    def test_full_pipe_drops_frames(self):
+        # Nobody reads the pipe : the frames pile up without blocking the game
+        step = {'type': 'step', 'content': 'x' * 1000}
+        with gevent.Timeout(5):
+            for frame in range(2000):
+                self.game.broadcast(dict(step, frame=frame))
+                gevent.sleep(0)
+        self.assertGreater(self.game.dropped_messages, 0)
+        self.assertLessEqual(len(self.game.outbox), self.game.outbox_size)
+
+        # The other messages are kept, and come after the frames still queued
+        self.game.post(('joined', 2, 1))
+        with gevent.Timeout(5):
+            while True:
+                wait_read(self.connection.fileno())
+                message = self.connection.recv()
+                if message[0] == 'joined':
+                    break
+                self.assertEqual(message[1]['type'], 'step')
+        self.assertEqual(message, ('joined', 2, 1))
@@ -21,7 +21,7 @@ class TestZatackaReplay(TestCase):
 
         for player in zatacka.players:
             zatacka.display_debug_frame(player, zatacka.grid.grid)
-            print(len(player.replay_adapter.phi_history))
+            print(len(player.replay_adapter.replay))
 
     def test_batch_learn_network(self):
         """
@@ -0,0 +1,59 @@
+from unittest import TestCase
+import time
+import copy
+from game_content import RolloutBotPlayer, Zatacka
+from game_content.zatacka import Grid
+
+
+class TestRolloutBot(TestCase):
+
+    def setUp(self):
+        self.grid = Grid(100, 100)
+        self.bot = RolloutBotPlayer(1, seed=0)
+        self.bot.spawn(50, 50, direction=0.)
+
+    def test_empty_surroundings(self):
+        self.bot.process(None, self.grid)
+        self.assertEqual(self.bot.command, 'straight')
+        self.assertEqual(self.bot.rollouts_last_tick, 0)
+
+    def test_avoids_wall(self):
+        # Wall in front of the snake, only a hard right turn goes around it
+        for y in range(0, 55):
+            self.grid.set(80, y, 2)
+        self.bot.process(None, self.grid)
+        self.assertEqual(self.bot.command, 'right')
+        self.assertGreater(self.bot.rollouts_last_tick, 0)
+
+    def test_time_budget(self):
+        self.bot.time_budget = 0.002
+        for y in range(0, 100, 3):
+            self.grid.set(70, y, 2)
+        start = time.time()
+        self.bot.process(None, self.grid)
+        self.assertLess(time.time() - start, 0.02)
+        self.assertEqual(self.bot.rollout_stats()['searched_ticks'], 1)
+
+    def test_small_budget_is_saved_up(self):
+        for y in range(0, 100, 3):
+            self.grid.set(70, y, 2)
+        self.bot.process(None, self.grid)
+        self.bot.time_budget = self.bot.batch_time / 4
+        searched = self.bot.searched_ticks
+        for _ in range(40):
+            self.bot.process(None, self.grid)
+        # About one search every 4 ticks, the time spent stays within the budget
+        self.assertLess(self.bot.searched_ticks - searched, 20)
+        self.assertGreater(self.bot.searched_ticks - searched, 0)
+
+    def test_survives_in_game(self):
+        game = Zatacka(80, 80, headless=True, seed=1)
+        game.players = [RolloutBotPlayer(1, seed=1)]
+        game.grid = game.new_grid()
+        game.frame = -1
+        game.spawn_players()
+        alive_players = copy.copy(game.players)
+        for _ in range(300):
+            game.run_action_step(alive_players)
+            game.run_display(alive_players)
+        self.assertTrue(game.players[0].alive)
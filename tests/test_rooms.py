@@ -0,0 +1,81 @@
+from unittest import TestCase
+import gevent
+from game_content import Zatacka
+from game_content.rooms import RoomManager, DEFAULT_ROOM
+
+
+class FakeSocket(object):
+
+    def __init__(self):
+        self.sent = []
+
+    def send(self, data):
+        self.sent.append(data)
+
+
+class TestRoomManager(TestCase):
+
+    def setUp(self):
+        self.rooms = RoomManager(factory=lambda: Zatacka(60, 60))
+
+    def tearDown(self):
+        for game in self.rooms.rooms.values():
+            game.stop()
+
+    def test_join_until_full(self):
+        players = [self.rooms.join(DEFAULT_ROOM) for _ in range(Zatacka.max_players - 1)]
+        self.assertNotIn(None, players)
+        # the house bot takes the last slot
+        self.assertTrue(self.rooms.room(DEFAULT_ROOM).is_full)
+        self.assertIsNone(self.rooms.join(DEFAULT_ROOM))
+        self.assertNotEqual(self.rooms.pick_room(), DEFAULT_ROOM)
+
+    def test_rooms_are_independent(self):
+        first = self.rooms.join('a')
+        second = self.rooms.join('b')
+        self.assertIsNot(self.rooms.room('a'), self.rooms.room('b'))
+        self.assertEqual(first.id, second.id)
+
+    def test_empty_rooms_are_closed(self):
+        player = self.rooms.join('a')
+        observer = self.rooms.observe('a', FakeSocket(), 'json')
+        game = self.rooms.room('a')
+        self.rooms.leave('a', player)
+        self.assertIn('a', self.rooms.rooms)
+        self.rooms.stop_observing('a', observer)
+        gevent.sleep(0)
+        self.assertNotIn('a', self.rooms.rooms)
+        self.assertIsNone(game.greenlet)
+
+    def test_routing(self):
+        urls = ['http://worker0', 'http://worker1', 'http://worker2']
+        workers = [RoomManager(worker_id=i, worker_urls=urls) for i in range(len(urls))]
+        for room_id in ['default', 'a', 'b', 'c', 'd']:
+            owners = [worker.worker_id for worker in workers if worker.is_local(room_id)]
+            self.assertEqual(len(owners), 1)
+            other = workers[(owners[0] + 1) % len(urls)]
+            self.assertEqual(other.url_for(room_id), '{}/?room={}'.format(urls[owners[0]], room_id))
+            self.assertRaises(ValueError, other.room, room_id)
+        for worker in workers:
+            self.assertTrue(worker.is_local(worker.pick_room()))
+
+    def test_house_bots_share_the_tick(self):
+        for room_id in 'abcd':
+            self.rooms.join(room_id)
+        budgets = [self.rooms.room(room_id).players[0].time_budget for room_id in 'abcd']
+        self.assertEqual(budgets, [RoomManager.house_bot_share * Zatacka.frame_time / 4] * 4)
+        self.rooms.room('a').stop()
+        del self.rooms.rooms['a']
+        self.rooms.share_bot_budget()
+        self.assertAlmostEqual(self.rooms.room('b').players[0].time_budget,
+                               RoomManager.house_bot_share * Zatacka.frame_time / 3)
+
+    def test_stats(self):
+        self.rooms.join('a')
+        self.rooms.observe('a', FakeSocket(), 'json')
+        gevent.sleep(0)
+        stats = self.rooms.stats()['a']
+        self.assertEqual((stats['players'], stats['observers']), (2, 1))
+        queue, = stats['observer_queues']
+        self.assertEqual(queue['role'], 'spectator')
+        self.assertIn('max_lag', queue)
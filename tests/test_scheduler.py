@@ -0,0 +1,87 @@
+from unittest import TestCase
+from game_content import scheduler
+from game_content.scheduler import TickScheduler, Histogram
+
+
+class FakeClock(object):
+
+    def __init__(self):
+        self.now = 100.
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, duration):
+        self.sleeps.append(duration)
+        self.now += duration
+
+
+def run_ticks(policy, work, nb_ticks=20, slow_tick=5):
+    """
+    Tick slow_tick takes work seconds, the other ones take no time
+    Returns the scheduler and the time of each tick
+    """
+    clock = FakeClock()
+    ticks = TickScheduler(0.01, policy, max_catch_up=3, clock=clock, sleep=clock.sleep)
+    times = []
+    for tick in range(nb_ticks):
+        ticks.wait(tick)
+        times.append(clock.now)
+        if tick == slow_tick:
+            clock.now += work
+    return ticks, times
+
+
+class TestTickScheduler(TestCase):
+
+    def test_on_time(self):
+        ticks, times = run_ticks(scheduler.CATCH_UP, work=0.)
+        for a, b in zip(times, times[1:]):
+            self.assertAlmostEqual(b - a, 0.01)
+        self.assertEqual(ticks.missed_deadlines, 0)
+        self.assertFalse(ticks.overloaded())
+
+    def test_catch_up(self):
+        ticks, times = run_ticks(scheduler.CATCH_UP, work=0.1)
+        # 9 ticks run back to back, then the schedule is met again
+        self.assertEqual(ticks.missed_deadlines, 9)
+        self.assertAlmostEqual(times[-1] - times[0], 0.19)
+        self.assertEqual(ticks.skipped_time, 0.)
+
+    def test_capped(self):
+        ticks, times = run_ticks(scheduler.CAPPED, work=0.1)
+        # 3 ticks caught up, the rest of the delay is forgotten
+        self.assertEqual(ticks.missed_deadlines, 3)
+        self.assertAlmostEqual(ticks.skipped_time, 0.06)
+        self.assertAlmostEqual(times[-1] - times[0], 0.25)
+
+    def test_skip(self):
+        ticks, times = run_ticks(scheduler.SKIP, work=0.1)
+        self.assertEqual(ticks.missed_deadlines, 1)
+        self.assertAlmostEqual(ticks.skipped_time, 0.1 - 0.01)
+        self.assertAlmostEqual(times[7] - times[6], 0.01)
+
+    def test_overloaded(self):
+        clock = FakeClock()
+        ticks = TickScheduler(0.01, scheduler.SKIP, overload_window=10, clock=clock, sleep=clock.sleep)
+        for tick in range(20):
+            ticks.wait(tick)
+            clock.now += 0.02
+        self.assertTrue(ticks.overloaded())
+        stats = ticks.stats()
+        self.assertEqual(stats['missed_deadlines'], 19)
+        self.assertEqual(stats['tick_durations']['<=0.02'], 19)
+
+    def test_unknown_policy(self):
+        self.assertRaises(ValueError, TickScheduler, 0.01, 'whatever')
+
+
+class TestHistogram(TestCase):
+
+    def test_buckets(self):
+        histogram = Histogram((0.01, 0.1))
+        for value in (0.001, 0.01, 0.05, 2.):
+            histogram.add(value)
+        self.assertEqual(histogram.buckets(), {'<=0.01': 2, '<=0.1': 1, '>0.1': 1})
+        self.assertEqual(histogram.max, 2.)
@@ -0,0 +1,331 @@
+from unittest import TestCase
+import copy
+import time
+import random
+import json
+import gevent
+import numpy as np
+from game_content import Player, BotPlayer, Zatacka
+from game_content import protocol, observer
+from game_content.arena_snapshot import paint_runs
+
+
+class FakeSocket(object):
+
+    def __init__(self):
+        self.sent = []
+        self.closed = False
+
+    def send(self, data):
+        self.sent.append(data)
+
+    def close(self):
+        self.closed = True
+
+
+class CirclingBot(BotPlayer):
+
+    def process(self, message, game_state):
+        self.command = 'left'
+
+
+def play_game(game, max_frames=2000):
+    game.grid = game.new_grid()
+    game.scheduler.reset()
+    game.frame = -1
+    game.spawn_players()
+    alive_players = copy.copy(game.players)
+    while alive_players and game.frame < max_frames:
+        game.run_action_step(alive_players)
+        game.run_display(alive_players)
+    return alive_players
+
+
+class TestHeadlessZatacka(TestCase):
+
+    def setUp(self):
+        random.seed(0)
+        self.game = Zatacka(60, 60, headless=True, watch=True, seed=0)
+        self.game.players = [Player(1), Player(2)]
+        # One message per tick
+        self.game.send_rates = {}
+
+    def test_fast_forward_without_frames(self):
+        start = time.time()
+        play_game(self.game)
+        self.assertLess(time.time() - start, 2)
+        self.assertEqual(len(self.game.game_history), 0)
+        self.assertGreater(sum(player.score for player in self.game.players), 0)
+
+    def test_watch_turns_frames_back_on(self):
+        socket = FakeSocket()
+        self.game.register_observer(socket)
+        self.assertTrue(self.game.watched)
+        play_game(self.game, max_frames=5)
+        gevent.sleep(0)
+        self.assertEqual(len(self.game.game_history), 6)
+        # size, players and arena, then the frames
+        self.assertEqual(len(socket.sent), 3 + 6)
+
+    def test_empty_game_yields(self):
+        game = Zatacka(60, 60, headless=True, watch=False, seed=0)
+        game.start()
+        gevent.sleep(0.01)
+        self.assertEqual(game.games_played, 1)
+        game.stop()
+
+    def test_games_follow_each_other(self):
+        game = Zatacka(60, 60, headless=True, watch=False, seed=0)
+        game.players = [CirclingBot(1)]
+        game.start()
+        start = time.time()
+        while game.games_played < 2 and time.time() - start < 5:
+            gevent.sleep(0.01)
+        game.stop()
+        self.assertGreaterEqual(game.games_played, 2)
+        # No pause between the games of a headless room with players
+        self.assertLess(time.time() - start, 2)
+
+
+class CountingZatacka(Zatacka):
+
+    def __init__(self, *args, **kwargs):
+        super(CountingZatacka, self).__init__(*args, **kwargs)
+        self.encoded = 0
+
+    def encode(self, data, protocol_name=protocol.JSON):
+        self.encoded += 1
+        return super(CountingZatacka, self).encode(data, protocol_name)
+
+
+class TestBroadcast(TestCase):
+
+    def setUp(self):
+        random.seed(0)
+        self.game = CountingZatacka(60, 60, seed=0)
+        self.game.players = [Player(1), Player(2)]
+        self.game.send_rates = {}
+        self.sockets = [FakeSocket() for _ in range(10)]
+        for socket in self.sockets:
+            self.game.register_observer(socket)
+        gevent.sleep(0)
+        for socket in self.sockets:
+            socket.sent = []
+        self.game.encoded = 0
+
+    def test_frames_encoded_once(self):
+        play_game(self.game, max_frames=9)
+        gevent.sleep(0)
+        self.assertEqual(self.game.encoded, 10)
+        for socket in self.sockets:
+            self.assertEqual(socket.sent, self.sockets[0].sent)
+            self.assertIs(socket.sent[0], self.sockets[0].sent[0])
+
+    def test_late_joiner_gets_arena_snapshot(self):
+        play_game(self.game, max_frames=200)
+        for protocol_name in (protocol.JSON, protocol.BINARY):
+            socket = FakeSocket()
+            self.game.register_observer(socket, protocol_name)
+            gevent.sleep(0)
+            # size, players then one arena message
+            self.assertEqual(len(socket.sent), 3)
+            arena = socket.sent[2]
+            if protocol_name == protocol.JSON:
+                arena = json.loads(arena)
+            else:
+                arena = self.game.codecs[protocol.BINARY].decode_arena(arena)
+            self.assertEqual(arena['frame'], self.game.frame)
+            np.testing.assert_array_equal(paint_runs(arena['runs'], 60, 60), self.game.grid.grid)
+
+    def test_binary_protocol(self):
+        binary_sockets = [FakeSocket() for _ in range(3)]
+        for socket in binary_sockets:
+            self.game.register_observer(socket, protocol.BINARY)
+        gevent.sleep(0)
+        self.assertEqual(json.loads(binary_sockets[0].sent[0])['scale'], 64)
+
+        play_game(self.game, max_frames=9)
+        gevent.sleep(0)
+        self.assertEqual(self.game.encoded, 9 + 20)
+        codec = self.game.codecs[protocol.BINARY]
+        for payload, message in zip(binary_sockets[0].sent[3:], self.game.game_history):
+            self.assertIsInstance(payload, bytes)
+            self.assertEqual(len(payload), 6 + 6 * len(message['content']))
+            decoded = codec.decode_step(payload)
+            self.assertEqual(decoded['frame'], message['frame'])
+            for snake, original in zip(decoded['content'], message['content']):
+                self.assertEqual(snake['id'], original['id'])
+                self.assertAlmostEqual(snake['x'], original['x'], delta=1. / 64)
+                self.assertAlmostEqual(snake['y'], original['y'], delta=1. / 64)
+
+
+class TestSendRates(TestCase):
+
+    def setUp(self):
+        self.game = Zatacka(60, 60, seed=0)
+        self.game.players = [Player(1), Player(2)]
+        self.sockets = {}
+        for role in (observer.PLAYER, observer.SPECTATOR):
+            for protocol_name in (protocol.JSON, protocol.BINARY):
+                socket = self.sockets[role, protocol_name] = FakeSocket()
+                self.game.register_observer(socket, protocol_name, role)
+        gevent.sleep(0)
+        for socket in self.sockets.values():
+            socket.sent = []
+
+    def received_steps(self, role, protocol_name):
+        codec = self.game.codecs[protocol_name]
+        steps, messages = [], 0
+        for payload in self.sockets[role, protocol_name].sent:
+            if isinstance(payload, bytes):
+                message = codec.decode_bundle(payload) if payload[0] == protocol.BUNDLE \
+                    else codec.decode_step(payload)
+            else:
+                message = json.loads(payload)
+            if message['type'] == 'bundle':
+                self.assertEqual(message['frame'], message['steps'][-1]['frame'])
+                steps.extend(message['steps'])
+            elif message['type'] == 'step':
+                steps.append(message)
+            else:
+                continue
+            messages += 1
+        return steps, messages
+
+    def test_bundles_keep_every_step(self):
+        self.assertEqual(self.game.send_interval(observer.PLAYER), 3)
+        self.assertEqual(self.game.send_interval(observer.SPECTATOR), 4)
+        play_game(self.game, max_frames=59)
+        gevent.sleep(0)
+        for role in (observer.PLAYER, observer.SPECTATOR):
+            for protocol_name in (protocol.JSON, protocol.BINARY):
+                steps, messages = self.received_steps(role, protocol_name)
+                pending = self.game.pending_steps[role]
+                self.assertLess(len(pending), self.game.send_interval(role))
+                self.assertEqual([step['frame'] for step in steps + pending],
+                                 [step['frame'] for step in self.game.game_history])
+                self.assertLessEqual(messages * self.game.send_interval(role), 60)
+
+    def test_game_end_is_sent(self):
+        play_game(self.game)
+        gevent.sleep(0)
+        steps, _ = self.received_steps(observer.SPECTATOR, protocol.BINARY)
+        self.assertEqual(steps[-1]['frame'], self.game.frame)
+        self.assertTrue(steps[-1]['died'])
+
+
+class SlowSocket(FakeSocket):
+
+    def send(self, data):
+        gevent.sleep(1)
+
+
+class TestObserverQueues(TestCase):
+
+    def setUp(self):
+        self.game = Zatacka(60, 60, seed=0)
+        self.game.players = [Player(1), Player(2)]
+        self.game.observer_queue_size = 8
+        self.game.send_rates = {}
+
+    def test_slow_observer_does_not_block(self):
+        fast, slow = FakeSocket(), SlowSocket()
+        self.game.register_observer(fast)
+        slow_observer = self.game.register_observer(slow)
+        start = time.time()
+        play_game(self.game, max_frames=30)
+        gevent.sleep(0)
+        self.assertLess(time.time() - start, 1)
+        frames = [json.loads(payload) for payload in fast.sent]
+        self.assertEqual(len([frame for frame in frames if frame['type'] == 'step']), 31)
+
+        stats = slow_observer.stats()
+        self.assertLessEqual(stats['queued'], 8)
+        self.assertGreater(stats['dropped_messages'], 0)
+
+    def test_snapshot_policy(self):
+        self.game.observer_policy = observer.SEND_SNAPSHOT
+        slow_observer = self.game.register_observer(SlowSocket())
+        play_game(self.game, max_frames=30)
+        self.assertGreater(slow_observer.resyncs, 0)
+        self.assertLessEqual(len(slow_observer.queue), 8)
+
+    def test_disconnect_policy(self):
+        self.game.observer_policy = observer.DISCONNECT
+        slow, fast = SlowSocket(), FakeSocket()
+        self.game.register_observer(slow)
+        self.game.register_observer(fast)
+        play_game(self.game, max_frames=30)
+        self.assertEqual(len(self.game.clients), 1)
+        # The connection is closed too, so the server stops waiting on it
+        self.assertTrue(slow.closed)
+        self.assertFalse(fast.closed)
+
+    def test_remove_observer(self):
+        observer_ = self.game.register_observer(FakeSocket())
+        self.game.remove_observer(observer_)
+        self.assertEqual(self.game.clients, [])
+        self.assertTrue(observer_.closed)
+
+    def test_remove_player(self):
+        alive_players = play_game(self.game, max_frames=0)
+        leaving = self.game.players[0]
+        self.game.remove_player(leaving)
+        self.game.run_action_step(alive_players)
+        self.game.run_display(alive_players)
+        self.assertNotIn(leaving, self.game.players)
+        self.assertNotIn(leaving, alive_players)
+
+    def test_broken_socket(self):
+        self.game.register_observer(None)
+        gevent.sleep(0)
+        self.assertEqual(self.game.clients, [])
+
+
+class TestSnapshot(TestCase):
+
+    def setUp(self):
+        self.game = Zatacka(60, 60, headless=True, seed=3)
+        self.game.players = [Player(1), Player(2)]
+        self.game.grid = self.game.new_grid()
+        self.game.frame = -1
+        self.game.spawn_players()
+        self.commands = random.Random(1)
+
+    def play(self, nb_frames):
+        for _ in range(nb_frames):
+            for player in self.game.players:
+                player.command = self.commands.choice(['left', 'right', None])
+            self.game.run_action_step(self.game.players)
+
+    def test_restore(self):
+        self.play(10)
+        grid = self.game.grid.grid.copy()
+        positions = [(p.snake.x, p.snake.y, p.snake.direction) for p in self.game.players]
+        snapshot = self.game.snapshot()
+
+        self.play(200)
+        self.assertTrue((self.game.grid.grid != grid).any())
+        self.game.restore(snapshot)
+
+        np.testing.assert_array_equal(self.game.grid.grid, grid)
+        self.assertEqual([(p.snake.x, p.snake.y, p.snake.direction) for p in self.game.players],
+                         positions)
+        self.assertEqual(self.game.frame, snapshot.frame)
+        self.assertTrue(all(p.alive for p in self.game.players))
+
+    def test_restore_is_repeatable(self):
+        snapshot = self.game.snapshot()
+        results = []
+        for _ in range(3):
+            self.commands = random.Random(2)
+            self.play(50)
+            results.append(self.game.grid.grid.copy())
+            self.game.restore(snapshot)
+        np.testing.assert_array_equal(results[0], results[2])
+        self.assertFalse(self.game.grid.grid.any())
+
+    def test_other_game(self):
+        snapshot = self.game.snapshot()
+        self.game.grid = self.game.new_grid()
+        self.assertRaises(ValueError, self.game.restore, snapshot)
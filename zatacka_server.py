@@ -5,11 +5,17 @@ import logging
 import numpy
 import json
 import gevent
-from flask import Flask, render_template
+from flask import Flask, Response, render_template, request, redirect
 from flask_sockets import Sockets
 import math
 import random
+from urllib.parse import parse_qs
 from game_content import Player, BotPlayer, COLORS, Zatacka
+from game_content import protocol
+from game_content.observer import SPECTATOR
+from game_content.rooms import RoomManager, DEFAULT_ROOM
+from game_content.remote import RemoteZatacka
+from game_content.playback import PlaybackZatacka
 
 
 app = Flask(__name__)
@@ -17,38 +23,120 @@ app.debug = True #'DEBUG' in os.environ
 
 sockets = Sockets(app)
 
+# Every game is recorded there when set, and the rooms named replay-<file>
+# play the recording <file> back
+RECORDING_DIR = os.environ.get('ZATACKA_RECORDING_DIR')
+REPLAY_PREFIX = 'replay-'
+
+# Trace the latency of the commands of the players, shown on /stats
+TRACE_LATENCY = bool(os.environ.get('ZATACKA_TRACE_LATENCY'))
+
+
+def make_rooms():
+    """
+    Several workers each run on their own address, listed in ZATACKA_WORKER_URLS
+    (comma separated), ZATACKA_WORKER_ID being the index of this one.
+    A worker is a separate single worker server (gunicorn -w 1) : the workers
+    of one gunicorn share a port and an environment, so the requests of a room
+    could reach any of them.
+    With ZATACKA_SIMULATION_PROCESS set, each game runs in a process of its own
+    """
+    worker_urls = [url for url in os.environ.get('ZATACKA_WORKER_URLS', '').split(',') if url]
+    game_class = RemoteZatacka if os.environ.get('ZATACKA_SIMULATION_PROCESS') else Zatacka
+
+    def factory():
+        game = game_class(recording_dir=RECORDING_DIR)
+        game.trace_latency = TRACE_LATENCY
+        return game
+    return RoomManager(factory=factory, worker_id=int(os.environ.get('ZATACKA_WORKER_ID', 0)),
+                       worker_urls=worker_urls)
+
+
+def socket_room(ws):
+    query = parse_qs(ws.environ.get('QUERY_STRING', ''))
+    return query.get('room', [DEFAULT_ROOM])[0], query
+
+
+def replay_factory(room_id, query):
+    """
+    Game of a replay room, played at ?speed= times the normal speed
+    Returns None for the other rooms
+    """
+    if RECORDING_DIR is None or not room_id.startswith(REPLAY_PREFIX):
+        return None
+    path = os.path.join(RECORDING_DIR, os.path.basename(room_id[len(REPLAY_PREFIX):]))
+    if not os.path.isfile(path):
+        return None
+    # Checked and clamped by the playback
+    speed = query.get('speed', ['1'])[0]
+    return lambda: PlaybackZatacka(path, speed)
+
+
+def redirect_socket(ws, room_id):
+    ws.send(json.dumps({'type': 'redirect', 'url': rooms.url_for(room_id)}))
+
 
 @app.route('/')
 def index():
+    room_id = request.args.get('room')
+    if room_id is None or not rooms.is_local(room_id):
+        return redirect(rooms.url_for(room_id or rooms.pick_room()))
     return render_template('index.html')
 
 
+@app.route('/stats')
+def stats():
+    """
+    Players, observers, tick and latency statistics of the rooms of this worker
+    """
+    return Response(json.dumps(rooms.stats()), mimetype='application/json')
+
+
 @sockets.route('/submit')
 def submit(ws):
-    player = zatacka.register_player()
-    if player is None: # there were already 6 players in the game
+    room_id, _ = socket_room(ws)
+    if not rooms.is_local(room_id):
+        redirect_socket(ws, room_id)
         return
+    # Nobody plays in a replay room, and joining first would make it a live game
+    player = None if room_id.startswith(REPLAY_PREFIX) else rooms.join(room_id)
+    if player is None: # there were already 6 players in the room
+        ws.send(json.dumps({'type': 'full', 'room': room_id}))
+        rooms.collect(room_id)
+        return
+    # The client needs its id to find the echoes of its commands
+    ws.send(json.dumps({'type': 'joined', 'id': player.id, 'trace': TRACE_LATENCY}))
 
-    print('submit', ws, dir(ws))
-    while ws is not None:
-        gevent.sleep(0.01)
-        message = ws.receive()
-
-        if message:
+    # receive() blocks the greenlet until a message arrives, and returns None
+    # once the socket is closed, so idle connections cost nothing
+    try:
+        while True:
+            message = ws.receive()
+            if message is None:
+                break
             app.logger.info('received: {}'.format(message))
             player.process(message, None)
-    #zatacka.remove_player(player)
+    finally:
+        rooms.leave(room_id, player)
 
 
 @sockets.route('/receive')
 def receive(ws):
-    # register ws
-    zatacka.register_observer(ws)
+    room_id, query = socket_room(ws)
+    if not rooms.is_local(room_id):
+        redirect_socket(ws, room_id)
+        return
+    # register ws, the client picks its protocol with ?protocol=binary
+    # and its frame rate with ?role=player or ?role=spectator
+    observer = rooms.observe(room_id, ws, query.get('protocol', [protocol.JSON])[0],
+                             query.get('role', [SPECTATOR])[0], replay_factory(room_id, query))
 
-    print('receive', ws, dir(ws))
-    while ws is not None:
-        gevent.sleep(0.01)
+    # Observers never send anything, receive() only returns once the socket is closed
+    try:
+        while ws.receive() is not None:
+            pass
+    finally:
+        rooms.stop_observing(room_id, observer)
 
 
-zatacka = Zatacka()
-zatacka.start()
+rooms = make_rooms()